@@ -1,32 +1,101 @@
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from utils.memory import ResearchMemory
+from utils.cache import LRUCache, SQLiteCache, TieredCache, compressed_json_dumps, compressed_json_loads
+from utils.context_packer import ContextPacker
+from utils.memory import ResearchMemory, content_hash
+from utils.llm import OPENAI_MODEL, get_chat_model, invoke_llm, stream_llm
+from utils.metrics import record
+from utils.results import ResearchResult
 import os
+import re
 from datetime import datetime
 
 from dotenv import load_dotenv
-import json
 from datetime import datetime
 
 load_dotenv()
 
 TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "604800"))  # evergreen topics
+ANSWER_CACHE_RECENT_TTL = float(os.getenv("ANSWER_CACHE_RECENT_TTL", "900"))  # time-sensitive topics
+ANSWER_CACHE_DIR = os.getenv("ANSWER_CACHE_DIR", "./data/cache")  # empty = memory tier only
+
+_TIME_SENSITIVE_WORDS = frozenset("""
+latest recent recently today tonight yesterday tomorrow current currently now
+breaking live upcoming
+""".split())
+_THIS_PERIOD = re.compile(r"\bthis\s+(week|month)\b")
+_DATE_PATTERN = re.compile(
+    r"\b(19|20)\d{2}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b|"
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b|"
+    r"\b\d{1,2}(st|nd|rd|th)?\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b"
+)
+
+
+def is_time_sensitive(topic: str, context: str = "") -> bool:
+    """
+    Whether an answer goes stale quickly: recency words ("latest", "today",
+    "this week", ...) or an explicit date or year in the topic or context
+    """
+    text = f"{topic} {context}".lower()
+    if _DATE_PATTERN.search(text) or _THIS_PERIOD.search(text):
+        return True
+    return not _TIME_SENSITIVE_WORDS.isdisjoint(re.findall(r"[a-z]+", text))
+
+
+def answer_ttl(topic: str, context: str = "") -> float:
+    """
+    Seconds a cached answer stays valid for this topic
+    """
+    return ANSWER_CACHE_RECENT_TTL if is_time_sensitive(topic, context) else ANSWER_CACHE_TTL
+
+
+def results_fingerprint(results: List[ResearchResult]) -> str:
+    """
+    Hash of the research results an answer was written from, including the
+    URLs of collapsed near-duplicates since those are cited too. Content
+    whitespace is normalized: results loaded back from memory are re-joined
+    from their passages.
+    """
+    parts = []
+    for result in results:
+        parts += [result.url, result.title, result.source]
+        parts.append(" ".join(result.content.split()))
+        parts += [duplicate.url for duplicate in result.duplicates]
+    return content_hash(*parts)
+
+
+def create_answer_cache() -> TieredCache:
+    """
+    Build the answer cache from the ANSWER_CACHE_* settings; the disk tier
+    stores compressed JSON so entries stay small
+    """
+    disk = None
+    if ANSWER_CACHE_DIR:
+        disk = SQLiteCache(
+            os.path.join(ANSWER_CACHE_DIR, "answer_cache.sqlite3"),
+            ttl=ANSWER_CACHE_TTL,
+            dumps=compressed_json_dumps,
+            loads=compressed_json_loads
+        )
+        disk.purge_expired()
+    return TieredCache(LRUCache(max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL), disk)
 
 class AnswerAgent:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7
-        )
+        self._llm = None  # created on the first LLM call
         self.memory = ResearchMemory()
-        self.current_date = datetime.now().strftime("%Y-%m-%d")
+        self.answer_cache = create_answer_cache() if ANSWER_CACHE_ENABLED else None
+        self.context_packer = ContextPacker()
+        # Template variables, like the research agent's prompts: filled per call, not at build time
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", f"""
         You are an expert AI research assistant responsible for synthesizing search-based research into structured, factual, and clear responses.
 
-        📅 Date: {self.current_date}
+        📅 Date: {{date}}
 
         Your responsibilities:
         1. Understand the user’s query and relevant context
@@ -40,21 +109,158 @@ class AnswerAgent:
         - **Detailed Analysis**: A deeper explanation with supporting facts
         - **Sources and Citations**: List of URLs or source names from research
 
-        ⚠️ Never reference model knowledge or training cutoffs. Only use retrieved information and assume the current year is {self.current_date.split('-')[0]}.
+        ⚠️ Never reference model knowledge or training cutoffs. Only use retrieved information and assume the current year is {{year}}.
         """),
             ("human", "{input}")
         ])
 
-        
-        
-        
+    @property
+    def current_date(self) -> str:
+        # Read on every call: the agent is long-lived and can outlast the day it was built
+        return datetime.now().strftime("%Y-%m-%d")
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_chat_model()
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
     async def generate_answer(self, 
-                            research_results: List[Dict],
+                            research_results: List[ResearchResult],
                             query: str,
                             additional_context: str = "",
-                            max_tokens: int = 256) -> Dict:
+                            max_tokens: int = 256,
+                            cache_ttl: Optional[float] = None) -> Dict:
         """
         Generate a comprehensive answer based on research results
+
+        `cache_ttl` overrides the topic-based answer cache TTL.
+        """
+        research_results = [ResearchResult.coerce(result) for result in research_results]
+        packed_results, context_stats = self.context_packer.pack(research_results, query)
+        key = self.answer_key(packed_results, query, additional_context, max_tokens)
+        cached = self._cached_answer(key)
+        if cached is not None:
+            return self.build_answer(cached["content"], research_results, query, max_tokens, cached["context_stats"])
+
+        formatted_prompt = self._build_answer_messages(packed_results, query, additional_context, max_tokens)
+        
+        # Get answer from LLM
+        response = await invoke_llm(self.llm, formatted_prompt, purpose="answer")
+        
+        self._store_answer(key, response.content, context_stats, query, additional_context, cache_ttl)
+        return self.build_answer(response.content, research_results, query, max_tokens, context_stats)
+
+    async def stream_answer(self,
+                            research_results: List[ResearchResult],
+                            query: str,
+                            additional_context: str = "",
+                            max_tokens: int = 256,
+                            context_stats: Optional[Dict] = None,
+                            cache_ttl: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream the answer tokens as the LLM produces them
+
+        If `context_stats` is given it is filled with the context packing stats.
+        A cached answer is yielded as a single chunk.
+        """
+        research_results = [ResearchResult.coerce(result) for result in research_results]
+        packed_results, stats = self.context_packer.pack(research_results, query)
+        key = self.answer_key(packed_results, query, additional_context, max_tokens)
+        cached = self._cached_answer(key)
+        if cached is not None:
+            if context_stats is not None:
+                context_stats.update(cached["context_stats"])
+            yield cached["content"]
+            return
+
+        formatted_prompt = self._build_answer_messages(packed_results, query, additional_context, max_tokens)
+        if context_stats is not None:
+            context_stats.update(stats)
+        chunks = []
+        async for chunk in stream_llm(self.llm, formatted_prompt, purpose="answer_stream"):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+        self._store_answer(key, "".join(chunks), stats, query, additional_context, cache_ttl)
+
+    def answer_key(self,
+                   packed_results: List[ResearchResult],
+                   query: str,
+                   additional_context: str = "",
+                   max_tokens: int = 256) -> str:
+        """
+        Answer cache key: the request parameters plus a fingerprint of the
+        packed research results, so results that add nothing to the packed
+        context still hit
+        """
+        return content_hash(
+            OPENAI_MODEL,
+            " ".join(query.lower().split()),
+            " ".join(additional_context.lower().split()),
+            str(max_tokens),
+            results_fingerprint(packed_results)
+        )
+
+    def _cached_answer(self, key: str) -> Optional[Dict]:
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.get(key)
+        record("answer_cache", cache_hit=cached is not None)
+        if cached is None:
+            return None
+        return {"content": cached["content"], "context_stats": {**cached["context_stats"], "answer_cache_hit": True}}
+
+    def _store_answer(self,
+                      key: str,
+                      content: str,
+                      context_stats: Dict,
+                      query: str,
+                      additional_context: str,
+                      ttl: Optional[float] = None):
+        if self.answer_cache is not None and content:
+            self.answer_cache.set(
+                key,
+                {"content": content, "context_stats": context_stats},
+                ttl=answer_ttl(query, additional_context) if ttl is None else ttl
+            )
+
+    def build_answer(self,
+                     content: str,
+                     research_results: List[ResearchResult],
+                     query: str,
+                     max_tokens: int = 256,
+                     context_stats: Optional[Dict] = None) -> Dict:
+        """
+        Assemble the answer payload returned to callers
+        """
+        # Extract sources from research results
+        sources = self._extract_sources(research_results)
+        
+        return {
+            "content": content,
+            "sources": sources,
+            "metadata": {
+                "query": query,
+                "timestamp": datetime.now().isoformat(),
+                "source_count": len(sources),
+                "max_tokens": max_tokens,
+                **(context_stats or {})
+            }
+        }
+
+    def _build_answer_messages(self,
+                               packed_results: List[ResearchResult],
+                               query: str,
+                               additional_context: str,
+                               max_tokens: int) -> List:
+        """
+        Build the chat messages for answer synthesis from research results
+        already packed into the input-token budget
         """
         answer_prompt = ChatPromptTemplate.from_messages([
             ("system", f"""
@@ -88,72 +294,38 @@ class AnswerAgent:
         Please draft a comprehensive, well-structured answer using the provided results.
         """)
         ])
-                
+
+
         # Format the prompt with the actual values
-        formatted_prompt = answer_prompt.format_messages(
+        return answer_prompt.format_messages(
             query=query,
             context=additional_context,
-            research_results=self._format_research_results(research_results)
+            research_results=self._format_research_results(packed_results)
         )
-        
-        # Get answer from LLM
-        response = await self.llm.ainvoke(formatted_prompt)
-        
-        # Extract sources from research results
-        sources = self._extract_sources(research_results)
-        
-        return {
-            "content": response.content,
-            "sources": sources,
-            "metadata": {
-                "query": query,
-                "timestamp": datetime.now().isoformat(),
-                "source_count": len(sources),
-                "max_tokens": max_tokens
-            }
-        }
     
-    def _format_research_results(self, results: List[Dict]) -> str:
+    def _format_research_results(self, results: List[ResearchResult]) -> str:
         """
         Format research results for the prompt
         """
-        formatted = []
-        for i, result in enumerate(results, 1):
-            formatted.append(f"""
-            Result {i}:
-            Title: {result['title']}
-            Content: {result['content']}
-            Source: {result['source']}
-            URL: {result['url']}
-            """)
-        return "\n".join(formatted)
+        return "\n".join(result.prompt_text(i) for i, result in enumerate(results, 1))
     
-    def _extract_sources(self, results: List[Dict]) -> List[Dict]:
-        """Extract and clean sources from research results"""
+    def _extract_sources(self, results: List[ResearchResult]) -> List[Dict]:
+        """Extract sources from research results; titles are cleaned when results are built"""
         seen = set()
         sources = []
         for result in results:
-            # Get URL from multiple possible fields
-            url = result.get("url") or result.get("link") or ""
-            if not url:
-                continue
-                
-            # Clean title text
-            title = result.get("title", "Source")
-            if "for:" in title:
-                title = title.split("for:")[0].strip()
-            title = title.replace("Result for", "").strip()
-
-            if url not in seen:
-                seen.add(url)
-                sources.append({
-                    "title": title or "Source",
-                    "url": url
-                })
+            # Near-duplicate contents were collapsed into one result; their URLs are still cited
+            for source in ResearchResult.coerce(result).sources():
+                if source.url and source.url not in seen:
+                    seen.add(source.url)
+                    sources.append({
+                        "title": source.title or "Source",
+                        "url": source.url
+                    })
         return sources
     
     async def request_clarification(self, 
-                                research_results: List[Dict],
+                                research_results: List[ResearchResult],
                                 query: str,
                                 context: str = "") -> str:
         """
@@ -192,9 +364,11 @@ class AnswerAgent:
         formatted_prompt = analysis_prompt.format_messages(
             query=query,
             context=context,
-            research_results=json.dumps(research_results, indent=2)
+            research_results=self._format_research_results(
+                [ResearchResult.coerce(result) for result in research_results]
+            )
         )
         # Get clarification request from LLM
-        response = await self.llm.ainvoke(formatted_prompt)
+        response = await invoke_llm(self.llm, formatted_prompt, purpose="clarification")
         
         return response.content
\ No newline at end of file
@@ -1,28 +1,77 @@
-from typing import List, Dict, Tuple
-from langchain_openai import ChatOpenAI
+from typing import AsyncIterator, List, Dict, Optional, Sequence, Tuple
 from langchain.prompts import ChatPromptTemplate
-from tools.tavily_tool import TavilySearchTool
+from tools.tavily_tool import SearchError, TavilySearchTool
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.context_packer import tokenize_words
+from utils.dedup import create_dedup_filter
+from utils.llm import get_chat_model, invoke_llm
+from utils.metrics import record
+from utils.results import ResearchResult
+import asyncio
+import contextlib
 import os
+import re
 from dotenv import load_dotenv
 from datetime import datetime
 load_dotenv()
 
 TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+RESEARCH_FANOUT_CONCURRENCY = int(os.getenv("RESEARCH_FANOUT_CONCURRENCY", "4"))
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR")  # unset = memory tier only
+QUERY_REWRITE_DETERMINISTIC = os.getenv("QUERY_REWRITE_DETERMINISTIC", "false").lower() == "true"
+QUERY_REWRITE_BYPASS = os.getenv("QUERY_REWRITE_BYPASS", "false").lower() == "true"
+REFRESH_MAX_RESULTS = int(os.getenv("REFRESH_MAX_RESULTS", "10"))  # cap on the merged result set of an incremental refresh
+
+_QUESTION_WORDS = frozenset("""
+what how why who when where which can could should would is are do does did
+explain tell describe write give list help compare summarize find
+""".split())
+_RECENCY_WORDS = frozenset(["latest", "recent", "recently", "today", "current", "now", "new"])
+
+
+def looks_like_search_query(topic: str, context: str = "") -> bool:
+    """
+    Cheap check for topics that are already keyword-style search queries.
+
+    Questions, instructions, long inputs and anything with extra context
+    still go through the LLM rewrite, as do recency words without a year,
+    since the rewrite is what pins those to a date.
+    """
+    if context.strip():
+        return False
+    words = re.findall(r"[\w.+-]+", topic.lower())
+    if not 2 <= len(words) <= 12 or re.search(r"[?!]|\.\s", topic):
+        return False
+    if words[0] in _QUESTION_WORDS:
+        return False
+    has_year = bool(re.search(r"\b(19|20)\d{2}\b", topic))
+    return has_year or not _RECENCY_WORDS.intersection(words)
+
+
+def create_query_cache() -> TieredCache:
+    """
+    Build the query-rewrite cache from the QUERY_CACHE_* settings
+    """
+    disk = None
+    if QUERY_CACHE_DIR:
+        disk = SQLiteCache(os.path.join(QUERY_CACHE_DIR, "query_cache.sqlite3"), ttl=QUERY_CACHE_TTL)
+    return TieredCache(LRUCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL), disk)
 
 class ResearchAgent:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7
-        )
+        self._llm = None  # created on the first LLM call
         self.tavily = TavilySearchTool()
-        self.current_date = datetime.now().strftime("%Y-%m-%d")
+        self.query_cache = create_query_cache() if QUERY_CACHE_ENABLED else None
+        self.dedup = create_dedup_filter()
         self.prompt = ChatPromptTemplate.from_messages([
         ("system", f"""
     You are an intelligent, up-to-date research assistant who crafts high-quality search engine queries to help find the most recent and reliable information from the web.
 
-    📅 Date: {self.current_date}  
+    📅 Date: {{date}}  
     Ignore any outdated training knowledge. Instead, focus on helping the user find real-time, factual answers through smart search queries.
 
     🔍 How to Write the Best Query:
@@ -47,6 +96,44 @@ class ResearchAgent:
     Write one optimized search query based on this information:
     """)
     ])
+        self.fan_out_prompt = ChatPromptTemplate.from_messages([
+        ("system", f"""
+    You are an intelligent, up-to-date research assistant who breaks a research topic into several complementary search engine queries.
+
+    📅 Date: {{date}}  
+    Ignore any outdated training knowledge. Instead, focus on helping the user find real-time, factual answers through smart search queries.
+
+    🔍 How to Write the Queries:
+    1. If the user mentions “recent”, “latest”, “today”, or specific dates (e.g., April 2025), **explicitly include those in every query**.
+    2. Each query should cover a different angle of the topic (e.g., facts, recent developments, comparisons, expert analysis).
+    3. Avoid near-duplicate queries; together they should cover the topic broadly.
+
+    🎯 Output:
+    - Return **exactly {{num_queries}} search queries, one per line**.
+    - Do not number them or include extra text, explanations, or formatting.
+    """),
+        ("human", """
+    Research Topic: {topic}
+    Additional Context: {context}
+
+    Write {num_queries} diverse, optimized search queries based on this information:
+    """)
+    ])
+
+    @property
+    def current_date(self) -> str:
+        # Read on every call: the agent is long-lived and can outlast the day it was built
+        return datetime.now().strftime("%Y-%m-%d")
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_chat_model()
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
 
     async def research_topic(
         self,
@@ -54,42 +141,299 @@ class ResearchAgent:
         context: str = "",
         max_iterations: int = 1,
         search_type: str = "basic",
-        max_results: int = 2
-    ) -> Tuple[List[Dict], str]:
-        # Generate research query with length constraint
-        response = await self.llm.ainvoke(
-            self.prompt.format(topic=topic, context=context)
-        )
-        query = response.content[:380].strip() + "..."  # Enforce 380 char limit
+        max_results: int = 2,
+        num_queries: int = 1
+    ) -> Tuple[List[ResearchResult], str]:
+        if num_queries > 1:
+            return await self._research_fan_out(topic, context, search_type, max_results, num_queries)
+
+        query = (await self._rewrite_queries(topic, context, 1))[0]
+        
+        # A failed search (after retries) raises SearchError rather than
+        # letting the answer be written from zero results
+        raw_results = await self._search(query, search_type, max_results)
         
+        results = self.deduplicate(self._process_results(raw_results))
+        return results, query
+
+    async def _research_fan_out(
+        self,
+        topic: str,
+        context: str,
+        search_type: str,
+        max_results: int,
+        num_queries: int
+    ) -> Tuple[List[ResearchResult], str]:
+        """
+        Generate several sub-queries in one LLM call and search them concurrently
+        """
+        queries = await self._rewrite_queries(topic, context, num_queries)
+
+        semaphore = asyncio.Semaphore(RESEARCH_FANOUT_CONCURRENCY)
+        outcomes = await asyncio.gather(*[
+            self._search(query, search_type, max_results, semaphore) for query in queries
+        ], return_exceptions=True)
+        raw_batches = self._successful_searches(outcomes)
+
+        # Merge in query order, keeping the first occurrence of each URL
+        results = []
+        seen = set()
+        for raw_results in raw_batches:
+            for result in self._process_results(raw_results):
+                if result.url not in seen:
+                    seen.add(result.url)
+                    results.append(result)
+
+        return self.deduplicate(results), "\n".join(queries)
+
+    async def iter_research(
+        self,
+        topic: str,
+        context: str = "",
+        search_type: str = "basic",
+        max_results: int = 2,
+        num_queries: int = 1
+    ) -> AsyncIterator[List[ResearchResult]]:
+        """
+        Like the fan-out mode, but yield each search's new (URL-deduplicated)
+        results as soon as that search completes instead of waiting for all.
+
+        Near-duplicates of already yielded results are attached to those
+        results in place rather than yielded again.
+        """
+        queries = await self._rewrite_queries(topic, context, num_queries)
+        semaphore = asyncio.Semaphore(RESEARCH_FANOUT_CONCURRENCY)
+        tasks = [
+            asyncio.ensure_future(self._search(query, search_type, max_results, semaphore))
+            for query in queries
+        ]
+        seen = set()
+        kept: List[ResearchResult] = []
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    raw_results = await next_done
+                except SearchError as e:
+                    record("search_error", error=str(e))
+                    errors.append(e)
+                    continue
+                batch = []
+                for result in self._process_results(raw_results):
+                    if result.url not in seen:
+                        seen.add(result.url)
+                        batch.append(result)
+                batch = self.deduplicate(batch, existing=kept)
+                kept.extend(batch)
+                yield batch
+            if len(errors) == len(tasks):
+                raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def research_gaps(
+        self,
+        gaps: List[str],
+        topic: str,
+        search_type: str = "basic",
+        max_results: int = 2
+    ) -> Tuple[List[ResearchResult], str]:
+        """
+        Follow-up round: one search led by the missing terms, without an LLM rewrite
+        """
+        anchor = [term for term in dict.fromkeys(tokenize_words(topic)) if term not in gaps]
+        query = " ".join(gaps + anchor)[:380]
         try:
-            # Get Tavily results with error handling
-            raw_results = await self.tavily._arun(
+            raw_results = await self._search(query, search_type, max_results)
+        except SearchError as e:
+            # The earlier rounds' results still stand; the loop ends on no new results
+            record("search_error", error=str(e))
+            return [], query
+        return self._process_results(raw_results), query
+
+    async def research_updates(
+        self,
+        topic: str,
+        since: float,
+        queries: Sequence[str] = (),
+        context: str = "",
+        search_type: str = "basic",
+        max_results: int = 2
+    ) -> Tuple[List[ResearchResult], str]:
+        """
+        Incremental refresh: search only for content published since `since`
+        (epoch seconds of the last run), reusing that run's search queries so
+        no rewrite is needed. Tavily filters by day, so results from the day
+        of the last run come back too; `merge_updates` drops those.
+        """
+        queries = list(queries) or await self._rewrite_queries(topic, context, 1)
+        start_date = datetime.fromtimestamp(since).strftime("%Y-%m-%d")
+        semaphore = asyncio.Semaphore(RESEARCH_FANOUT_CONCURRENCY)
+        outcomes = await asyncio.gather(*[
+            self._search(query, search_type, max_results, semaphore, start_date=start_date) for query in queries
+        ], return_exceptions=True)
+
+        results = []
+        seen = set()
+        for raw_results in self._successful_searches(outcomes):
+            for result in self._process_results(raw_results):
+                if result.url not in seen:
+                    seen.add(result.url)
+                    results.append(result)
+        return results, "\n".join(queries)
+
+    def merge_updates(self,
+                      previous: List[ResearchResult],
+                      updates: List[ResearchResult]) -> Tuple[List[ResearchResult], int]:
+        """
+        Merge refresh results into the stored ones; returns the merged set and
+        how many results are new or changed.
+
+        Known URLs with unchanged content are dropped, changed ones replace
+        their stored version in place, and new ones (near-duplicates of
+        stored results collapsed) go first, as the freshest material.
+        """
+        by_url = {result.url: i for i, result in enumerate(previous)}
+        known = set(by_url)
+        known.update(d.url for r in previous for d in r.duplicates)
+        merged = list(previous)
+        changed, new = 0, []
+        for result in updates:
+            if result.url not in known:
+                new.append(result)
+                continue
+            i = by_url.get(result.url)
+            # Stored content comes back re-joined from its passages, so compare it whitespace-insensitively
+            if i is not None and result.content.split() != merged[i].content.split():
+                if not result.duplicates:
+                    result.duplicates.extend(merged[i].duplicates)
+                merged[i] = result
+                changed += 1
+        new = self.deduplicate(new, existing=merged)
+        # Never below the stored set's size, so a wide run isn't cut down; the oldest results drop out
+        return (new + merged)[:max(REFRESH_MAX_RESULTS, len(previous))], changed + len(new)
+
+    def deduplicate(self,
+                    results: List[ResearchResult],
+                    existing: Sequence[ResearchResult] = ()) -> List[ResearchResult]:
+        """
+        Collapse near-duplicate contents, keeping their URLs as `duplicates`
+        """
+        if self.dedup is None:
+            return results
+        kept = self.dedup.dedupe(results, existing)
+        record("dedup", results=len(results), duplicates=len(results) - len(kept))
+        return kept
+
+    def assess_results(self,
+                       topic: str,
+                       context: str,
+                       results: List[ResearchResult],
+                       max_results: int) -> Tuple[float, List[str]]:
+        """
+        Cheap sufficiency score in [0, 1] plus the topic terms no result covers.
+
+        Blends term coverage, mean Tavily relevance and result count; no LLM call.
+        """
+        terms = list(dict.fromkeys(tokenize_words(f"{topic} {context}")))
+        if not results:
+            return 0.0, terms
+        covered = set()
+        for result in results:
+            covered.update(tokenize_words(f"{result.title} {result.content}"))
+        gaps = [term for term in terms if term not in covered]
+        coverage = 1 - len(gaps) / len(terms) if terms else 1.0
+        relevance = sum(r.score for r in results) / len(results)
+        volume = min(1.0, len(results) / max(1, max_results))
+        return 0.5 * coverage + 0.3 * relevance + 0.2 * volume, gaps
+
+    async def _search(self,
+                      query: str,
+                      search_type: str,
+                      max_results: int,
+                      semaphore: Optional[asyncio.Semaphore] = None,
+                      start_date: Optional[str] = None) -> List[Dict]:
+        async with semaphore or contextlib.nullcontext():
+            return await self.tavily._arun(
                 query=query,
                 search_depth=search_type,
-                max_results=max_results
+                max_results=max_results,
+                **({"start_date": start_date} if start_date else {})
             )
-        except Exception as e:
-            print(f"Tavily Error: {str(e)}")
-            return [{"error": str(e)}], query
-        
-        # Process results with validation
+
+    def _successful_searches(self, outcomes: List) -> List[List[Dict]]:
+        """
+        Raw results of the searches that succeeded; raises if every search failed
+        """
+        batches = []
+        for outcome in outcomes:
+            if isinstance(outcome, SearchError):
+                record("search_error", error=str(outcome))
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                batches.append(outcome)
+        if outcomes and not batches:
+            raise outcomes[0]
+        return batches
+
+    async def _rewrite_queries(self, topic: str, context: str, num_queries: int) -> List[str]:
+        """
+        Turn the topic into search queries, via the rewrite cache when possible
+        """
+        if QUERY_REWRITE_BYPASS and num_queries == 1 and looks_like_search_query(topic, context):
+            record("query_rewrite", bypass=True, cache_hit=False)
+            return [topic.strip()[:380]]
+
+        date = self.current_date
+        key = f"{date}|{num_queries}|{topic.strip()}|{context.strip()}"
+        if self.query_cache is not None:
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                record("query_rewrite", bypass=False, cache_hit=True)
+                return cached
+
+        # Temperature 0 keeps cached rewrites stable across runs
+        llm_kwargs = {"temperature": 0} if QUERY_REWRITE_DETERMINISTIC else {}
+        if num_queries == 1:
+            response = await invoke_llm(
+                self.llm,
+                self.prompt.format(topic=topic, context=context, date=date),
+                purpose="query_generation",
+                **llm_kwargs
+            )
+            queries = [response.content[:380].strip() + "..."]  # Enforce 380 char limit
+        else:
+            response = await invoke_llm(
+                self.llm,
+                self.fan_out_prompt.format(topic=topic, context=context, num_queries=num_queries, date=date),
+                purpose="query_fan_out",
+                **llm_kwargs
+            )
+            queries = [
+                re.sub(r"^(?:\d+[.)]|[-•*])\s*", "", line.strip()).strip("`\"")[:380]
+                for line in response.content.splitlines()
+                if line.strip()
+            ][:num_queries] or [topic[:380]]
+
+        record("query_rewrite", bypass=False, cache_hit=False)
+        if self.query_cache is not None:
+            self.query_cache.set(key, queries)
+        return queries
+
+    def _process_results(self, raw_results: List[Dict]) -> List[ResearchResult]:
+        """
+        Normalize raw Tavily results, dropping errors and invalid URLs
+        """
         results = []
         for res in raw_results:
             if 'error' in res:
                 continue  # Skip error entries
-                
-            result = {
-                "title": res.get("title", "No title").split("for:")[0].strip(),
-                "content": res.get("content", ""),
-                "url": res.get("url") or res.get("link", ""),
-                "source": "Tavily",
-                "timestamp": str(res.get("timestamp", ""))
-            }
+
+            result = ResearchResult.from_dict(res)
             
             # Validate URL format
-            if result["url"].startswith(("http://", "https://")):
+            if result.url.startswith(("http://", "https://")):
                 results.append(result)
-        
-        print("Processed Results:", results)  # Debug cleaned results
-        return results, query
\ No newline at end of file
+        return results
@@ -1,6 +1,6 @@
 import streamlit as st
-import asyncio
-from main import run_research_workflow
+import uuid
+from serving import ResearchServer
 
 # Set page config
 st.set_page_config(
@@ -9,6 +9,16 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_research_server():
+    """
+    One background serving loop shared by every session of this process
+    """
+    return ResearchServer()
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Title and description
 st.title("🔍 Research Assistant")
 st.markdown("""
@@ -55,31 +65,76 @@ with st.form("research_form"):
             step=256,
             help="Maximum length of the output response (256-2048 tokens)"
         )
+
+        # Parallel sub-queries slider
+        num_queries = st.slider(
+            "Parallel Queries",
+            min_value=1,
+            max_value=5,
+            value=1,
+            help="Number of diverse sub-queries searched concurrently (1-5)"
+        )
     
     # Submit button
     submit_button = st.form_submit_button("Start Research")
 
+def render_research_job(server, job_id, answer_placeholder, sources_placeholder):
+    """
+    Poll the job's events, rendering tokens as they arrive
+    """
+    content = ""
+    result = None
+    cursor, done = 0, False
+    while not done:
+        events, done = server.poll(job_id, cursor, timeout=0.1)
+        cursor += len(events)
+        for event in events:
+            if event["type"] == "sources":
+                answer_placeholder.markdown("_Writing answer..._")
+                if event["sources"]:
+                    with sources_placeholder.container():
+                        st.markdown("### References")
+                        for source in event["sources"]:
+                            display_text = source['title'] if source['title'] != "Source" else "Source Document"
+                            st.markdown(f"- [{display_text}]({source['url']})")
+            elif event["type"] == "token":
+                content += event["content"]
+                answer_placeholder.markdown(content + "▌")
+            elif event["type"] == "answer":
+                result = event["answer"]
+                answer_placeholder.markdown(result["content"])
+            elif event["type"] == "error":
+                answer_placeholder.error(f"Research failed, please try again shortly. ({event['error']})")
+    return result
+
 # Handle form submission
 if submit_button and query:
-    with st.spinner("Researching..."):
-        # Run the research workflow
-        result = asyncio.run(run_research_workflow(
-            topic=query,
-            search_type=search_type,
-            max_results=max_results,
-            max_tokens=max_tokens
-        ))
-        
-        # Display results
-        st.markdown("## Research Results")
-        st.markdown(result["content"])
-        
-        # Replace the source display block with:
-        if result["sources"]:
-            st.markdown("### References")
-            for source in result["sources"]:
-                display_text = source['title'] if source['title'] != "Source" else "Source Document"
-                st.markdown(f"- [{display_text}]({source['url']})")
+    st.markdown("## Research Results")
+    answer_placeholder = st.empty()
+    sources_placeholder = st.empty()
+    answer_placeholder.markdown("_Researching..._")
+
+    server = get_research_server()
+    session_id = st.session_state.session_id
+    # A new question replaces this session's previous one if it is still running
+    if st.session_state.get("job_id"):
+        server.cancel(st.session_state.job_id, session_id)
+    job_id = server.submit(
+        session_id,
+        topic=query,
+        search_type=search_type,
+        max_results=max_results,
+        max_tokens=max_tokens,
+        num_queries=num_queries
+    )
+    st.session_state.job_id = job_id
+
+    # Stream the answer into the page; if the script is stopped or rerun
+    # mid-answer, this session stops waiting on the job
+    try:
+        render_research_job(server, job_id, answer_placeholder, sources_placeholder)
+    finally:
+        server.cancel(job_id, session_id)
             
 elif submit_button:
-    st.error("Please enter a research query.") 
\ No newline at end of file
+    st.error("Please enter a research query.")
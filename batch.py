@@ -0,0 +1,208 @@
+"""
+Batch research over many topics.
+
+Reads topics from JSONL (one object per line with a "topic" key and
+optional "id", "context", "search_type", "max_results", "max_tokens",
+"num_queries", "incremental"), runs them through the research workflow
+with bounded concurrency and appends one JSON line per finished topic to
+the output. The output file doubles as the checkpoint: re-running the
+same command skips topics that already have an answer there. A line that
+isn't valid JSON or has no usable "topic" gets an error line in the
+output and the rest of the batch carries on.
+
+Recurring scheduled runs should pass --incremental (with a new output
+file per run): topics researched before are refreshed with only the
+content published since, and keep their answer when nothing changed.
+
+    python batch.py topics.jsonl answers.jsonl --concurrency 8 --openai-rpm 500 --tavily-rpm 100
+    python batch.py topics.jsonl answers-$(date +%F).jsonl --incremental
+"""
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from main import run_research_workflow
+from utils.memory import content_hash
+from utils.rate_limiter import configure_rate_limit, get_rate_limiter, set_request_priority
+
+WORKFLOW_PARAMS = ("context", "search_type", "max_results", "max_tokens", "num_queries", "incremental")
+
+
+def topic_id(item: Dict) -> str:
+    """
+    Stable ID for a topic line, used as its checkpoint key
+    """
+    return str(item.get("id") or content_hash(item["topic"], item.get("context") or ""))
+
+
+def read_topics(path: str) -> Iterable[Dict]:
+    """
+    Topic objects from a JSONL file; a line that isn't valid JSON comes
+    through as an item carrying only its `error`
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"line-{number}", "error": f"JSONDecodeError: {e}"}
+
+
+def invalid_record(item, index: int) -> Optional[Dict]:
+    """
+    Error record for the `index`-th (1-based) input item if it can't be
+    researched, else None
+    """
+    if not isinstance(item, dict):
+        error = f"TypeError: expected a JSON object, got {type(item).__name__}"
+        return {"id": f"item-{index}", "error": error, "elapsed": 0.0}
+    if "topic" not in item:
+        error = item.get("error", "KeyError: 'topic'")
+    elif not isinstance(item["topic"], str) or not item["topic"].strip():
+        error = f"TypeError: 'topic' must be a non-empty string, got {item['topic']!r}"
+    elif not isinstance(item.get("context"), (str, type(None))):
+        error = f"TypeError: 'context' must be a string, got {type(item['context']).__name__}"
+    else:
+        return None
+    return {"id": str(item.get("id") or f"item-{index}"), "error": error, "elapsed": 0.0}
+
+
+def read_completed(path: str) -> Set[str]:
+    """
+    IDs that already have a successful answer in the output file
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partial line from an interrupted run
+            if "answer" in record:
+                completed.add(record["id"])
+    return completed
+
+
+async def run_research_batch(
+    topics: Iterable[Dict],
+    concurrency: int = 4,
+    skip_ids: Optional[Set[str]] = None,
+    **defaults
+) -> AsyncIterator[Dict]:
+    """
+    Research many topics concurrently, yielding a record as each completes.
+
+    `defaults` are workflow parameters applied to topics that don't set
+    their own. At most `concurrency` topics are in flight at once. An item
+    without a topic yields an error record instead of stopping the batch.
+    """
+    skip_ids = skip_ids or set()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    records: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        index = 0
+        try:
+            for index, item in enumerate(topics, 1):
+                record = invalid_record(item, index)
+                if record is not None:
+                    await records.put(record)
+                elif topic_id(item) not in skip_ids:
+                    await queue.put(item)
+        except Exception as e:
+            # The input itself failed (e.g. the file became unreadable); report it and let the workers finish
+            await records.put({"id": f"item-{index}", "error": f"{type(e).__name__}: {e}", "elapsed": 0.0})
+        finally:
+            # Workers exit on these, so they are queued however the input ends
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def work():
+        # Batch topics yield the rate limits to interactive requests in the same process
+        set_request_priority("batch")
+        while (item := await queue.get()) is not None:
+            # null in the input means unset, so the default applies
+            params = {**defaults, **{k: item[k] for k in WORKFLOW_PARAMS if item.get(k) is not None}}
+            record = {"id": topic_id(item), "topic": item["topic"]}
+            start = time.perf_counter()
+            try:
+                record["answer"] = await run_research_workflow(topic=item["topic"], **params)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["elapsed"] = round(time.perf_counter() - start, 3)
+            await records.put(record)
+        await records.put(None)
+
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        finished = 0
+        while finished < concurrency:
+            record = await records.get()
+            if record is None:
+                finished += 1
+            else:
+                yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def main(args):
+    if args.openai_rpm or args.openai_tpm:
+        openai = get_rate_limiter("openai")
+        configure_rate_limit(
+            "openai",
+            args.openai_rpm or (openai.rate * 60 if openai.rate else None),
+            tokens_per_minute=args.openai_tpm or openai.token_capacity or None
+        )
+    if args.tavily_rpm:
+        configure_rate_limit("tavily", args.tavily_rpm)
+
+    completed = read_completed(args.output)
+    if completed:
+        print(f"Resuming: {len(completed)} topics already done")
+
+    done = failed = 0
+    with open(args.output, "a", encoding="utf-8") as out:
+        async for record in run_research_batch(
+            read_topics(args.input),
+            concurrency=args.concurrency,
+            skip_ids=completed,
+            search_type=args.search_type,
+            max_results=args.max_results,
+            max_tokens=args.max_tokens,
+            num_queries=args.num_queries,
+            incremental=args.incremental
+        ):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            done += 1
+            failed += "error" in record
+            print(f"[{done}] {record['id']} {'FAILED' if 'error' in record else 'ok'} ({record['elapsed']}s)")
+
+    print(f"Finished {done} topics, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of topics")
+    parser.add_argument("output", help="JSONL file answers are appended to")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--openai-rpm", type=float, default=None, help="OpenAI requests per minute (default: OPENAI_RPM)")
+    parser.add_argument("--openai-tpm", type=float, default=None, help="OpenAI tokens per minute (default: OPENAI_TPM)")
+    parser.add_argument("--tavily-rpm", type=float, default=None, help="Tavily requests per minute (default: TAVILY_RPM)")
+    parser.add_argument("--search-type", default="basic", choices=["basic", "advanced"])
+    parser.add_argument("--max-results", type=int, default=2)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--num-queries", type=int, default=1)
+    parser.add_argument("--incremental", action="store_true", help="refresh stale stored research instead of redoing it")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""
+Concurrency check for request coalescing, with fake LLM/search/memory.
+
+Fires --duplicates concurrent identical requests for each of --topics
+topics, with coalescing off and then on, and reports wall time and
+backend calls. It then checks the single-flight invariants and exits
+non-zero if any fails:
+- each topic ran once
+- every caller got an answer of its own
+- cancelling one caller leaves the others' shared run intact
+- a run is cancelled only once every caller has gone
+
+    python -m benchmarks.coalescing_benchmark --topics 4 --duplicates 16
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from benchmarks.fakes import FakeChatModel, FakeTavilyClient, install_fakes
+import main
+
+
+async def burst(args) -> dict:
+    llm = FakeChatModel(latency=args.llm_latency, completion_tokens=50)
+    search = FakeTavilyClient(latency=args.search_latency)
+    install_fakes(main, llm, search)
+    main.workflow_flight.stats.update(calls=0, executions=0, coalesced=0)
+
+    start = time.perf_counter()
+    answers = await asyncio.gather(*[
+        main.run_research_workflow(topic=f"trending question {t}")
+        for t in range(args.topics)
+        for _ in range(args.duplicates)
+    ])
+    return {
+        "seconds": time.perf_counter() - start,
+        "llm_calls": llm.calls,
+        "search_calls": search.calls,
+        "answers": answers,
+        **main.workflow_flight.stats
+    }
+
+
+async def cancellation_checks(args) -> list:
+    failures = []
+    llm = FakeChatModel(latency=args.llm_latency, completion_tokens=50)
+    install_fakes(main, llm, FakeTavilyClient(latency=args.search_latency))
+
+    # One of three callers gives up: the other two still get the answer
+    callers = [asyncio.ensure_future(main.run_research_workflow(topic="cancel one caller")) for _ in range(3)]
+    await asyncio.sleep(args.search_latency / 2)
+    callers[0].cancel()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    if not isinstance(results[0], asyncio.CancelledError) or not all(isinstance(r, dict) for r in results[1:]):
+        failures.append("cancelling one caller affected the others")
+
+    # Every caller gives up: the shared run is cancelled too
+    callers = [asyncio.ensure_future(main.run_research_workflow(topic="cancel every caller")) for _ in range(3)]
+    await asyncio.sleep(args.search_latency / 2)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    llm_calls = llm.calls
+    # Long enough for an uncancelled run to reach its answer LLM call
+    await asyncio.sleep(2 * (args.llm_latency + args.search_latency))
+    if main.workflow_flight.inflight() or llm.calls != llm_calls:
+        failures.append("run kept going after every caller was cancelled")
+    return failures
+
+
+async def run(args) -> int:
+    total = args.topics * args.duplicates
+    print(f"{total} concurrent requests: {args.topics} topics x {args.duplicates} duplicates")
+    rows = {}
+    for coalescing in (False, True):
+        main.WORKFLOW_COALESCING = coalescing
+        rows[coalescing] = row = await burst(args)
+        print(f"  coalescing {'on ' if coalescing else 'off'}: {row['seconds']:.2f}s, "
+              f"{row['llm_calls']} LLM calls, {row['search_calls']} searches"
+              + (f", {row['executions']} runs, {row['coalesced']} coalesced" if coalescing else ""))
+
+    on = rows[True]
+    failures = []
+    if on["executions"] != args.topics or on["coalesced"] != total - args.topics:
+        failures.append(f"expected {args.topics} runs, got {on['executions']}")
+    if len({id(answer) for answer in on["answers"]}) != total:
+        failures.append("callers share answer objects")
+    if sum(answer["metadata"]["coalesced"] for answer in on["answers"]) != total - args.topics:
+        failures.append("coalesced answers are not marked")
+    failures += await cancellation_checks(args)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=4)
+    parser.add_argument("--duplicates", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,105 @@
+"""
+Measure the near-duplicate filter on synthetic search results: a set of
+original articles, each republished a few times with small edits (mirrors,
+syndication boilerplate), shuffled in with the originals.
+
+Reports filter time, how many results and prompt tokens were collapsed,
+and pair precision/recall against the known duplicate groups.
+
+    python -m benchmarks.dedup_benchmark --results 3000 --mirrors 2 --edit-rate 0.05
+"""
+import argparse
+import random
+import time
+from itertools import combinations
+
+from utils.context_packer import ContextPacker
+from utils.dedup import DEDUP_THRESHOLD, NearDuplicateFilter
+from utils.results import ResearchResult
+
+BOILERPLATE = [
+    "Originally published by a partner outlet.",
+    "This story was syndicated from a wire service.",
+    "Subscribe to our newsletter for more updates.",
+]
+
+
+def make_results(n: int, mirrors: int, edit_rate: float, words: int, seed: int = 0):
+    """
+    Synthetic results plus the ground-truth group of each one
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    results, groups = [], []
+    article = 0
+    while len(results) < n:
+        original = [rng.choice(vocabulary) for _ in range(words)]
+        for copy in range(min(1 + mirrors, n - len(results))):
+            text = list(original)
+            if copy:
+                for i in range(len(text)):
+                    if rng.random() < edit_rate:
+                        text[i] = rng.choice(vocabulary)
+                text.append(rng.choice(BOILERPLATE))
+            results.append(ResearchResult(
+                title=f"Article {article}",
+                url=f"https://site{copy}.example.com/{article}",
+                content=" ".join(text),
+                score=0.9
+            ))
+            groups.append(article)
+        article += 1
+    order = list(range(len(results)))
+    rng.shuffle(order)
+    return [results[i] for i in order], [groups[i] for i in order]
+
+
+def pair_scores(predicted, truth):
+    """
+    Precision/recall over the pairs of results placed in the same group
+    """
+    def pairs(labels):
+        members = {}
+        for i, label in enumerate(labels):
+            members.setdefault(label, []).append(i)
+        return {pair for group in members.values() for pair in combinations(group, 2)}
+
+    predicted_pairs, true_pairs = pairs(predicted), pairs(truth)
+    hits = len(predicted_pairs & true_pairs)
+    precision = hits / len(predicted_pairs) if predicted_pairs else 1.0
+    recall = hits / len(true_pairs) if true_pairs else 1.0
+    return precision, recall
+
+
+def main(args):
+    results, truth = make_results(args.results, args.mirrors, args.edit_rate, args.words)
+    dedup = NearDuplicateFilter(threshold=args.threshold)
+    packer = ContextPacker()
+
+    start = time.perf_counter()
+    kept = dedup.dedupe(results)
+    elapsed = time.perf_counter() - start
+
+    predicted = dedup.groups([r.content for r in results])
+    precision, recall = pair_scores(predicted, truth)
+    tokens_before = sum(packer.count_tokens(r.content) for r in results)
+    tokens_after = sum(packer.count_tokens(r.content) for r in kept)
+    cited = len(kept) + sum(len(r.duplicates) for r in kept)
+
+    print(f"{len(results)} results ({len(set(truth))} distinct articles), "
+          f"{args.words} words each, {args.edit_rate:.0%} words edited per mirror")
+    print(f"  filter time:    {elapsed * 1000:.1f} ms ({len(results) / elapsed:,.0f} results/s)")
+    print(f"  kept:           {len(kept)} results, {cited} URLs still cited")
+    print(f"  prompt tokens:  {tokens_before:,} -> {tokens_after:,} "
+          f"({1 - tokens_after / tokens_before:.1%} saved)")
+    print(f"  pair precision: {precision:.3f}  recall: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=3000)
+    parser.add_argument("--mirrors", type=int, default=2, help="near-duplicate copies per original article")
+    parser.add_argument("--edit-rate", type=float, default=0.05, help="fraction of words changed in each copy")
+    parser.add_argument("--words", type=int, default=300, help="words per article")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    main(parser.parse_args())
@@ -0,0 +1,112 @@
+"""
+Throughput of the memory embedding layer and query latency against a
+populated Chroma collection, on synthetic passages.
+
+For each --sizes entry it reports:
+- embedding docs/sec one document per call (the old per-item path),
+  batched, and batched again from the warm vector cache
+- ingest docs/sec into a fresh collection
+- query latency p50/p95 with cold and cached query embeddings
+
+    python -m benchmarks.embedding_benchmark --sizes 10000,100000
+    python -m benchmarks.embedding_benchmark --model default --sizes 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.workflow_benchmark import percentile
+from utils.embeddings import EMBEDDERS, CachedEmbeddingFunction, EmbeddingCache
+
+
+def make_passages(n: int, words: int, seed: int = 0):
+    rng = random.Random(seed)
+    # Zipf-ish vocabulary so passages share common words like real text
+    vocabulary = [f"w{i}" for i in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [" ".join(rng.choices(vocabulary, weights, k=words)) for _ in range(n)]
+
+
+def embedding_function(model: str, cache_dir=None) -> CachedEmbeddingFunction:
+    factory, dim = EMBEDDERS[model]
+    cache = EmbeddingCache(cache_dir, dim) if cache_dir else None
+    return CachedEmbeddingFunction(model, dim, factory, cache)
+
+
+def rate(count: int, seconds: float) -> float:
+    return count / max(seconds, 1e-9)
+
+
+def run_size(n: int, args) -> dict:
+    import chromadb
+
+    passages = make_passages(n, args.words)
+    queries = make_passages(args.queries, 8, seed=1)
+    workdir = tempfile.mkdtemp(prefix="bench-embeddings-")
+
+    uncached = embedding_function(args.model)
+    sample = passages[:min(n, args.per_item_sample)]
+    start = time.perf_counter()
+    for passage in sample:
+        uncached.embed([passage])
+    per_item = rate(len(sample), time.perf_counter() - start)
+
+    cached = embedding_function(args.model, os.path.join(workdir, "cache"))
+    start = time.perf_counter()
+    cached.embed(passages)
+    batched = rate(n, time.perf_counter() - start)
+    start = time.perf_counter()
+    cached.embed(passages)
+    warm = rate(n, time.perf_counter() - start)
+
+    client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+    collection = client.get_or_create_collection(
+        "benchmark", embedding_function=cached, metadata={"hnsw:space": "cosine"}
+    )
+    batch_size = min(args.batch_size, client.get_max_batch_size())
+    start = time.perf_counter()
+    for offset in range(0, n, batch_size):
+        chunk = passages[offset:offset + batch_size]
+        collection.add(ids=[str(offset + i) for i in range(len(chunk))], documents=chunk)
+    ingest = rate(n, time.perf_counter() - start)
+
+    latencies = {}
+    for label in ("cold", "cached"):
+        latencies[label] = []
+        for query in queries:
+            start = time.perf_counter()
+            collection.query(query_texts=[query], n_results=5)
+            latencies[label].append((time.perf_counter() - start) * 1000)
+
+    return {
+        "n": n,
+        "per_item": per_item,
+        "batched": batched,
+        "warm": warm,
+        "ingest": ingest,
+        **{f"{label}_p{q}": percentile(values, q) for label, values in latencies.items() for q in (50, 95)}
+    }
+
+
+def main(args):
+    print(f"model={args.model}, {args.words} words/passage, {args.queries} queries")
+    print(f"{'docs':>8} {'per-item/s':>11} {'batched/s':>10} {'cached/s':>10} {'ingest/s':>9} "
+          f"{'cold p50':>9} {'cold p95':>9} {'hit p50':>8} {'hit p95':>8}")
+    for n in [int(size) for size in args.sizes.split(",")]:
+        row = run_size(n, args)
+        print(f"{row['n']:>8} {row['per_item']:>11.0f} {row['batched']:>10.0f} {row['warm']:>10.0f} "
+              f"{row['ingest']:>9.0f} {row['cold_p50']:>8.2f}ms {row['cold_p95']:>7.2f}ms "
+              f"{row['cached_p50']:>6.2f}ms {row['cached_p95']:>6.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="hashing", choices=sorted(EMBEDDERS))
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated stored-document counts")
+    parser.add_argument("--words", type=int, default=120, help="words per passage")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per collection.add")
+    parser.add_argument("--per-item-sample", type=int, default=2000, help="documents timed on the per-item path")
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+"""
+Local stand-in for the Tavily search API.
+
+Serves `POST /search` with canned results after a configurable delay so the
+async search path can be exercised without an API key:
+
+    python -m benchmarks.fake_tavily_server --port 8765 --latency 0.2
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+import zlib
+
+
+def make_results(query: str, max_results: int, content_chars: int = 800):
+    """
+    Build deterministic fake search results for a query
+    """
+    return [
+        {
+            "title": f"Result {i} for: {query[:60]}",
+            "url": f"https://example.com/{zlib.crc32(f'{query}|{i}'.encode())}",
+            "content": " ".join(
+                f"{query} r{i}w{j}" for j in range(content_chars // (len(query) + 6) + 1)
+            )[:content_chars],
+            "score": round(1.0 - i * 0.1, 2),
+        }
+        for i in range(max_results)
+    ]
+
+
+def make_handler(latency: float, content_chars: int):
+    class FakeTavilyHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+            body = json.dumps({
+                "query": payload.get("query", ""),
+                "results": make_results(
+                    payload.get("query", ""),
+                    int(payload.get("max_results", 5)),
+                    content_chars
+                )
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeTavilyHandler
+
+
+class FakeTavilyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # don't drop bursts of concurrent connects
+
+
+def start_server(port: int = 0, latency: float = 0.2, content_chars: int = 800) -> FakeTavilyServer:
+    """
+    Start the stand-in server on a daemon thread and return it
+    """
+    server = FakeTavilyServer(("127.0.0.1", port), make_handler(latency, content_chars))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--content-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    server = FakeTavilyServer(("127.0.0.1", args.port), make_handler(args.latency, args.content_chars))
+    print(f"Fake Tavily API listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
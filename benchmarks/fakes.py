@@ -0,0 +1,150 @@
+"""
+Local stand-ins for ChatOpenAI, TavilyClient and ResearchMemory so the
+workflow can be benchmarked without API keys or network access.
+"""
+from typing import Dict, List
+import asyncio
+import os
+import tempfile
+import time
+import zlib
+
+# The real clients validate keys at construction; fakes replace them after
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench-chroma-"))
+os.environ.setdefault("ANSWER_CACHE_DIR", tempfile.mkdtemp(prefix="bench-answers-"))
+os.environ.setdefault("EMBEDDING_CACHE_DIR", tempfile.mkdtemp(prefix="bench-embeddings-"))
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+def estimate_tokens(messages) -> int:
+    if isinstance(messages, str):
+        return max(1, len(messages) // 4)
+    return sum(max(1, len(str(getattr(m, "content", m))) // 4) for m in messages)
+
+
+class FakeChatModel:
+    """
+    Chat model with configurable time-to-first-token, token rate and output length
+    """
+
+    def __init__(self,
+                 latency: float = 0.3,
+                 tokens_per_second: float = 100.0,
+                 completion_tokens: int = 200,
+                 chunk_tokens: int = 4):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+
+    def _text(self, messages, n_tokens: int) -> str:
+        seed = zlib.crc32(str(messages).encode())
+        return " ".join(f"tok{(seed + i) % 997}" for i in range(n_tokens))
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.completion_tokens / self.tokens_per_second)
+        prompt_tokens = estimate_tokens(messages)
+        text = self._text(messages, self.completion_tokens)
+        # The fan-out prompt expects one sub-query per line
+        if "search queries, one per line" in str(messages):
+            text = "\n".join(f"query {i} {text[:40]}" for i in range(5))
+        return AIMessage(content=text, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": self.completion_tokens,
+            "total_tokens": prompt_tokens + self.completion_tokens
+        })
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        words = self._text(messages, self.completion_tokens).split(" ")
+        for start in range(0, len(words), self.chunk_tokens):
+            chunk = words[start:start + self.chunk_tokens]
+            await asyncio.sleep(len(chunk) / self.tokens_per_second)
+            yield AIMessageChunk(content=" ".join(chunk) + " ")
+        prompt_tokens = estimate_tokens(messages)
+        yield AIMessageChunk(content="", usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": self.completion_tokens,
+            "total_tokens": prompt_tokens + self.completion_tokens
+        })
+
+
+class FakeTavilyClient:
+    """
+    Search backend returning synthetic results after a configurable delay.
+
+    `search` mirrors TavilyClient.search; `asearch` mirrors the tool's
+    `_asearch` so the async path can be swapped without a server.
+    """
+
+    def __init__(self, latency: float = 0.5, result_chars: int = 2000):
+        self.latency = latency
+        self.result_chars = result_chars
+        self.calls = 0
+
+    def _results(self, query: str, max_results: int) -> Dict:
+        words = query.split() or ["result"]
+        results = []
+        for i in range(max_results):
+            seed = zlib.crc32(f"{query}|{i}".encode())
+            # Query terms interleaved with per-result words, so results are not near-duplicates
+            content = " ".join(
+                f"{words[j % len(words)]} w{(seed + j) % 9973}" for j in range(self.result_chars // 10)
+            )
+            results.append({
+                "title": f"{query[:50]} ({i})",
+                "url": f"https://example.com/{seed}",
+                "content": content[:self.result_chars],
+                "score": round(1.0 - i * 0.05, 3)
+            })
+        return {"query": query, "results": results}
+
+    def search(self, query: str, search_depth: str = "basic", max_results: int = 5, **kwargs) -> Dict:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._results(query, max_results)
+
+    async def asearch(self, query: str, search_depth: str = "basic", max_results: int = 5, **kwargs) -> Dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._results(query, max_results)
+
+
+class FakeMemory:
+    """
+    In-process stand-in for ResearchMemory that never matches
+    """
+
+    def __init__(self):
+        self.writes = 0
+
+    def store_research_result(self, query: str, results: List[Dict], metadata=None, search_queries=None) -> str:
+        self.writes += 1
+        return f"research_{self.writes}"
+
+    def retrieve_similar_research(self, query: str, n_results: int = 3, where=None, hybrid=None) -> List[Dict]:
+        return []
+
+
+def install_fakes(main_module, llm: FakeChatModel, search: FakeTavilyClient, memory=None):
+    """
+    Point the workflow's agents at the fakes and clear the request caches
+    """
+    research_agent = main_module.get_research_agent()
+    answer_agent = main_module.get_answer_agent()
+    research_agent.llm = llm
+    answer_agent.llm = llm
+    research_agent.tavily.client = search
+    research_agent.tavily._asearch = search.asearch
+    research_agent.tavily.cache.clear()
+    if research_agent.query_cache is not None:
+        research_agent.query_cache.clear()
+    if answer_agent.answer_cache is not None:
+        answer_agent.answer_cache.clear()
+    answer_agent.memory = memory or FakeMemory()
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark of per-request graph overhead: compiling the LangGraph on
+every request versus reusing the shared compiled graph. Agents are replaced
+with no-op stubs so only orchestration cost is measured.
+
+    python -m benchmarks.graph_overhead --requests 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench-chroma-"))
+
+import main
+
+
+class StubResearchAgent:
+    async def research_topic(self, **kwargs):
+        return [], "stub query"
+
+    def assess_results(self, topic, context, results, max_results):
+        return 1.0, []
+
+
+class StubAnswerAgent:
+    async def generate_answer(self, **kwargs):
+        return {"content": "", "sources": [], "metadata": {}}
+
+
+async def per_request(n: int, shared: bool) -> float:
+    state = main.create_initial_state("topic", "", 1, "basic", 2, 256, 1)
+    start = time.perf_counter()
+    for _ in range(n):
+        graph = main.get_research_graph() if shared else main.create_research_graph()
+        await graph.ainvoke(dict(state))
+    return (time.perf_counter() - start) / n
+
+
+async def run(args):
+    main.research_agent = StubResearchAgent()
+    main.answer_agent = StubAnswerAgent()
+    main.MEMORY_CACHE_ENABLED = False
+
+    main.get_research_graph()  # warm the shared graph
+    rebuilt = await per_request(args.requests, shared=False)
+    shared = await per_request(args.requests, shared=True)
+
+    print(f"{args.requests} sequential requests with stub agents")
+    print(f"  compile per request: {rebuilt * 1000:.3f} ms/request")
+    print(f"  shared graph:        {shared * 1000:.3f} ms/request")
+    print(f"  saved:               {(rebuilt - shared) * 1000:.3f} ms/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
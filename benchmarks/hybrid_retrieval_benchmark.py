@@ -0,0 +1,118 @@
+"""
+Hybrid (BM25 + vector) retrieval over synthetic passages that each name
+an entity and a date, like "model4821 ... april 2025".
+
+Reports:
+- BM25 index build time and query latency p50/p95 at --passages, without
+  a filter and with a domain and a publication-date filter
+- ResearchMemory.retrieve_passages latency and entity recall@5, vector-only
+  vs hybrid, with --memory-passages stored in Chroma
+
+    python -m benchmarks.hybrid_retrieval_benchmark --passages 100000 --memory-passages 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# The hashing model needs no download; set before utils.embeddings is imported
+os.environ.setdefault("MEMORY_EMBEDDING", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_DIR", tempfile.mkdtemp(prefix="bench-embeddings-"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench-chroma-"))
+
+from benchmarks.workflow_benchmark import percentile
+from utils.lexical_index import BM25Index
+from utils.memory import ResearchMemory
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+DOMAINS = [f"site{i}.com" for i in range(50)]
+
+
+def make_passages(n: int, words: int, seed: int = 0):
+    """
+    (id, text, metadata) for n passages plus an entity query per passage
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    passages, queries = [], []
+    for i in range(n):
+        year, month = rng.choice([2023, 2024, 2025]), rng.randrange(12)
+        entity = f"model{i}"
+        body = rng.choices(vocabulary, weights, k=words)
+        body[rng.randrange(words)] = f"{entity} {MONTHS[month]} {year}"
+        passages.append((f"passage_{i}", " ".join(body), {
+            "kind": "passage",
+            "url": f"https://{DOMAINS[i % len(DOMAINS)]}/{i}",
+            "domain": DOMAINS[i % len(DOMAINS)],
+            "published_at": float((year - 1970) * 31536000 + month * 2628000)
+        }))
+        # A paraphrased question: the entity and date plus common words
+        queries.append(f"{entity} {MONTHS[month]} {year} " + " ".join(rng.choices(vocabulary[:200], k=3)))
+    return passages, queries
+
+
+def time_queries(search, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentile(latencies, 50), percentile(latencies, 95)
+
+
+def index_benchmark(args):
+    passages, queries = make_passages(args.passages, args.words)
+    queries = random.Random(1).sample(queries, args.queries)
+    index = BM25Index()
+    start = time.perf_counter()
+    for offset in range(0, len(passages), 5000):
+        batch = passages[offset:offset + 5000]
+        index.add([p[0] for p in batch], [p[1] for p in batch], [p[2] for p in batch])
+    print(f"BM25 index: {args.passages} passages built in {time.perf_counter() - start:.1f}s")
+    for term in {t for q in queries for t in q.split()}:
+        if term in index._postings:
+            index._posting(term)  # compile postings up front, as a warm index would have them
+
+    filters = {
+        "no filter": None,
+        "domain filter": {"domain": {"$in": DOMAINS[:5]}},
+        "date filter": {"published_at": {"$gte": float((2025 - 1970) * 31536000)}},
+    }
+    for label, where in filters.items():
+        p50, p95 = time_queries(lambda q: index.search(q, 20, where), queries)
+        print(f"  {label:<14} p50 {p50:6.2f} ms  p95 {p95:6.2f} ms")
+
+
+def memory_benchmark(args):
+    passages, queries = make_passages(args.memory_passages, args.words, seed=2)
+    memory = ResearchMemory(maintenance_interval=0)
+    memory.clear_memory()
+    start = time.perf_counter()
+    memory._upsert([p[0] for p in passages], [p[1] for p in passages], [p[2] for p in passages])
+    print(f"ResearchMemory: {args.memory_passages} passages stored in {time.perf_counter() - start:.1f}s")
+    memory.lexical  # build the index before timing
+
+    sample = random.Random(3).sample(range(len(queries)), args.queries)
+    for hybrid in (False, True):
+        memory.hybrid = hybrid
+        hits = sum(
+            f"passage_{i}" in [m["id"] for m in memory.retrieve_passages(queries[i], n_results=5)]
+            for i in sample
+        )
+        p50, p95 = time_queries(lambda q: memory.retrieve_passages(q, n_results=5), [queries[i] for i in sample])
+        print(f"  {'hybrid' if hybrid else 'vector only':<12} recall@5 {hits / len(sample):5.2f}  "
+              f"p50 {p50:6.2f} ms  p95 {p95:6.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--passages", type=int, default=100000, help="passages in the BM25 index benchmark")
+    parser.add_argument("--memory-passages", type=int, default=10000, help="passages stored in Chroma")
+    parser.add_argument("--words", type=int, default=80, help="words per passage")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    index_benchmark(args)
+    memory_benchmark(args)
@@ -0,0 +1,79 @@
+"""
+Check that importing the entry-point modules stays cheap.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter
+(best of --repeat runs), prints the cumulative import time and the
+heaviest direct imports, and exits non-zero when a module goes over its
+budget, so it can gate CI:
+
+    python -m benchmarks.import_time --budget-ms 300
+    python -m benchmarks.import_time main batch --budget-ms 150 --top 15
+"""
+from typing import Dict, List, Tuple
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str) -> List[Tuple[int, int, str]]:
+    """
+    (depth, cumulative microseconds, name) for every module imported by `module`
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{process.stderr[-2000:]}")
+    rows = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, int(cumulative), name.strip()))
+    return rows
+
+
+def measure(module: str, repeat: int) -> Tuple[float, Dict[str, float]]:
+    """
+    Best-of-`repeat` cumulative import time of `module` in ms, plus its direct imports
+    """
+    best, children = None, {}
+    for _ in range(repeat):
+        rows = import_times(module)
+        end = next(i for i, (depth, _, name) in enumerate(rows) if depth == 0 and name == module)
+        total = rows[end][1] / 1000
+        if best is None or total < best:
+            best = total
+            # A module's direct imports are listed at depth 1 just before its own line
+            start = end
+            while start > 0 and rows[start - 1][0] > 0:
+                start -= 1
+            children = {name: us / 1000 for depth, us, name in rows[start:end] if depth == 1}
+    return best, children
+
+
+def main(args) -> int:
+    failed = []
+    for module in args.modules:
+        total, children = measure(module, args.repeat)
+        status = "ok" if total <= args.budget_ms else "OVER BUDGET"
+        print(f"import {module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        for name, ms in sorted(children.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {ms:8.1f} ms  {name}")
+        if total > args.budget_ms:
+            failed.append(module)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["main", "batch"])
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="heaviest direct imports to list")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,150 @@
+"""
+Search calls and LLM tokens of recurring scheduled research, full
+re-research vs incremental refresh, on a simulated news feed.
+
+Every search query has its own feed, which starts with a backlog of older
+articles. Before every run each feed gets a new article with probability
+--update-rate. Every run is treated as stale (as if --interval-hours had
+passed), so the search, query-rewrite and short-lived answer caches start
+cold each run; only caches that outlive the interval are kept. The full
+mode re-researches every topic. The incremental mode refreshes stored
+research with only the articles published since the last run, and reuses
+the answer when the packed context is unchanged.
+
+    python -m benchmarks.incremental_refresh_benchmark --topics 5 --runs 10 --update-rate 0.3
+"""
+import argparse
+import asyncio
+import email.utils
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# The hashing model needs no download; set before utils.embeddings is imported
+os.environ.setdefault("MEMORY_EMBEDDING", "hashing")
+
+from benchmarks.fakes import FakeChatModel, install_fakes
+import main
+
+
+class NewsFeed:
+    """
+    Search backend over per-query article feeds, newest first, honouring
+    Tavily's `start_date` filter
+    """
+
+    def __init__(self, seed: int, backlog: int, result_chars: int):
+        self.rng = random.Random(seed)
+        self.backlog = backlog
+        self.result_chars = result_chars
+        self.feeds: Dict[str, List[Dict]] = {}
+        self.calls = 0
+
+    def _article(self, query: str, published: float) -> Dict:
+        n = sum(len(feed) for feed in self.feeds.values())
+        words = " ".join(f"w{self.rng.randrange(20000)}" for _ in range(self.result_chars // 6))
+        return {
+            "title": f"Article {n}",
+            "url": f"https://news.example.com/{n}",
+            "content": f"{query} {words}"[:self.result_chars],
+            "score": round(self.rng.uniform(0.5, 1.0), 3),
+            "published_date": email.utils.formatdate(published)
+        }
+
+    def feed(self, query: str) -> List[Dict]:
+        if query not in self.feeds:
+            self.feeds[query] = []
+            now = time.time()
+            for days in range(self.backlog, 0, -1):
+                self.feeds[query].append(self._article(query, now - days * 86400))
+        return self.feeds[query]
+
+    def publish(self, query: str):
+        self.feed(query).append(self._article(query, time.time()))
+
+    async def asearch(self, query: str, search_depth: str = "basic", max_results: int = 5,
+                      start_date: Optional[str] = None) -> Dict:
+        self.calls += 1
+        since = datetime.strptime(start_date, "%Y-%m-%d").timestamp() if start_date else 0.0
+        articles = [
+            article for article in reversed(self.feed(query))
+            if email.utils.parsedate_to_datetime(article["published_date"]).timestamp() >= since
+        ][:max_results]
+        return {"query": query, "results": articles}
+
+
+async def run_mode(incremental: bool, args) -> Dict:
+    from agents.answer_agent import ANSWER_CACHE_RECENT_TTL
+    from utils.memory import ResearchMemory
+
+    os.environ["CHROMA_PERSIST_DIR"] = tempfile.mkdtemp(prefix="bench-refresh-")
+    llm = FakeChatModel(latency=0.0, tokens_per_second=1e9, completion_tokens=args.completion_tokens)
+    feed = NewsFeed(seed=0, backlog=args.backlog, result_chars=args.result_chars)
+    install_fakes(main, llm, feed, memory=ResearchMemory(maintenance_interval=0))
+    main.MEMORY_CACHE_MAX_AGE = 0  # every run comes after the freshness window
+    research_agent, answer_agent = main.get_research_agent(), main.get_answer_agent()
+    topics = [f"latest developments in field {t}" for t in range(args.topics)]
+    updates = random.Random(1)
+
+    totals = {"llm_calls": 0, "search_calls": 0, "search_results": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    regenerated = 0
+    for run in range(args.runs):
+        # Caches that expire within the interval between scheduled runs
+        research_agent.tavily.cache.clear()
+        if research_agent.query_cache is not None:
+            research_agent.query_cache.clear()
+        if not incremental and ANSWER_CACHE_RECENT_TTL < args.interval_hours * 3600:
+            answer_agent.answer_cache.clear()
+        if run:
+            for query in list(feed.feeds):
+                if updates.random() < args.update_rate:
+                    feed.publish(query)
+
+        answers = await asyncio.gather(*[
+            main.run_research_workflow(
+                topic=topic,
+                max_iterations=args.max_iterations,
+                max_results=args.max_results,
+                max_tokens=args.completion_tokens,
+                num_queries=args.num_queries,
+                incremental=incremental
+            )
+            for topic in topics
+        ])
+        for answer in answers:
+            metrics = answer["metadata"]["metrics"]
+            for key in totals:
+                totals[key] += metrics[key]
+            regenerated += not answer["metadata"].get("answer_cache_hit", False)
+    return {**totals, "regenerated": regenerated}
+
+
+async def run(args):
+    answers = args.topics * args.runs
+    print(f"{args.topics} topics x {args.runs} runs, update rate {args.update_rate}, "
+          f"num_queries={args.num_queries}, max_iterations={args.max_iterations}")
+    print(f"{'mode':<12} {'searches':>9} {'results':>8} {'llm calls':>10} {'prompt tok':>11} "
+          f"{'completion':>11} {'regenerated':>12}")
+    for incremental in (False, True):
+        row = await run_mode(incremental, args)
+        print(f"{'incremental' if incremental else 'full':<12} {row['search_calls']:>9} {row['search_results']:>8} "
+              f"{row['llm_calls']:>10} {row['prompt_tokens']:>11} {row['completion_tokens']:>11} "
+              f"{row['regenerated']:>7}/{answers}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--update-rate", type=float, default=0.3, help="chance a feed gets a new article before a run")
+    parser.add_argument("--interval-hours", type=float, default=24.0, help="simulated time between runs")
+    parser.add_argument("--backlog", type=int, default=10, help="older articles per feed before the first run")
+    parser.add_argument("--max-results", type=int, default=3)
+    parser.add_argument("--max-iterations", type=int, default=2)
+    parser.add_argument("--num-queries", type=int, default=2)
+    parser.add_argument("--completion-tokens", type=int, default=256)
+    parser.add_argument("--result-chars", type=int, default=1500)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Query latency of ResearchMemory under continuous inserts, with retention
+off and on.
+
+A writer thread stores synthetic research at --insert-rate while the main
+thread keeps querying passages. Each window reports the document count,
+on-disk size and query latency. Without retention the collection (and
+latency) keeps growing. With it, evictions cap the collection at
+--max-documents and background compaction keeps the index small.
+
+    python -m benchmarks.memory_retention_benchmark --seconds 90 --insert-rate 5 --max-documents 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+# The hashing model needs no download; set before utils.embeddings is imported
+os.environ.setdefault("MEMORY_EMBEDDING", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_DIR", tempfile.mkdtemp(prefix="bench-embeddings-"))
+
+from benchmarks.workflow_benchmark import percentile
+from utils.memory import ResearchMemory
+
+
+def make_research(rng: random.Random, i: int, results: int, words: int):
+    vocabulary = [f"w{n}" for n in range(5000)]
+    return f"topic {i} {' '.join(rng.choices(vocabulary, k=6))}", [
+        {
+            "url": f"https://example.com/{i}/{j}",
+            "title": f"Result {i}.{j}",
+            "content": " ".join(rng.choices(vocabulary, k=words))
+        }
+        for j in range(results)
+    ]
+
+
+def run(retention: bool, args):
+    os.environ["CHROMA_PERSIST_DIR"] = tempfile.mkdtemp(prefix="bench-memory-")
+    memory = ResearchMemory(
+        max_documents=args.max_documents if retention else 0,
+        maintenance_interval=args.maintenance_interval if retention else 0
+    )
+    stop = threading.Event()
+    inserted = [0]
+
+    def writer():
+        rng = random.Random(0)
+        while not stop.is_set():
+            started = time.perf_counter()
+            memory.store_research_result(*make_research(rng, inserted[0], args.results, args.words))
+            inserted[0] += 1
+            if args.insert_rate:
+                stop.wait(max(0.0, 1 / args.insert_rate - (time.perf_counter() - started)))
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    rng = random.Random(1)
+    window = args.seconds / args.windows
+    print(f"retention {'on' if retention else 'off'}:")
+    print(f"{'t s':>6} {'docs':>7} {'disk MB':>8} {'queries':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for w in range(args.windows):
+        latencies, end = [], time.perf_counter() + window
+        while time.perf_counter() < end:
+            started = time.perf_counter()
+            memory.retrieve_passages(f"w{rng.randrange(5000)} w{rng.randrange(5000)}", n_results=5)
+            latencies.append((time.perf_counter() - started) * 1000)
+        stats = memory.stats()
+        print(f"{(w + 1) * window:>6.0f} {stats['documents']:>7} {stats['disk_bytes'] / 2**20:>8.1f} "
+              f"{len(latencies):>8} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f}")
+    stop.set()
+    thread.join()
+    memory.stop_maintenance()
+    stats = memory.stats()
+    print(f"  {inserted[0]} research inserts, evictions {stats['evictions']}, compactions {stats['compactions']}")
+
+
+def main(args):
+    for retention in (False, True):
+        run(retention, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=90.0)
+    parser.add_argument("--windows", type=int, default=6)
+    parser.add_argument("--insert-rate", type=float, default=5.0, help="research inserts/sec (0 = as fast as possible)")
+    parser.add_argument("--results", type=int, default=3, help="results per research")
+    parser.add_argument("--words", type=int, default=300, help="words per result")
+    parser.add_argument("--max-documents", type=int, default=1000)
+    parser.add_argument("--maintenance-interval", type=float, default=10.0)
+    main(parser.parse_args())
@@ -0,0 +1,173 @@
+"""
+Memory used by search results, measured with tracemalloc: the plain dicts
+results used to be vs the slotted ResearchResult, and the prompt text
+rendered from them.
+
+Reports:
+- bytes per result beyond its content, for results built from search
+  records (content strings shared with the records) and for results
+  reloaded from JSON (e.g. from memory), where every record carries its
+  own copy of the source name
+- characters and tracemalloc peak of rendering one request's results into
+  the answer prompt plus the clarification prompt, the old indented
+  f-string and `json.dumps(indent=2)` vs `ResearchResult.prompt_text`
+- peak and retained traced memory of a batch run through the workflow
+  with fake search and LLM backends
+
+    python -m benchmarks.result_memory_benchmark --results 10000 --batch-topics 200 --result-chars 8000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from utils.results import ResearchResult
+
+
+def search_records(n: int, chars: int, seed: int = 0) -> List[Dict]:
+    """
+    Raw records shaped like Tavily search results
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "title": f"Article {i} - Result for: topic {i % 50}",
+            "url": f"https://site{i % 97}.example.com/article/{i}",
+            "content": " ".join(f"w{rng.randrange(20000)}" for _ in range(chars // 6))[:chars],
+            "score": round(rng.uniform(0.3, 1.0), 3),
+            "published_date": datetime(2025, 1 + i % 12, 1 + i % 28).isoformat()
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_result(res: Dict) -> Dict:
+    """
+    A result as the research agent used to build it
+    """
+    result = {
+        "title": res.get("title", "No title").split("for:")[0].strip(),
+        "content": res.get("content", ""),
+        "url": res.get("url") or res.get("link", ""),
+        "source": "Tavily",
+        "timestamp": str(res.get("timestamp", "")),
+        "score": float(res.get("score") or 0.0)
+    }
+    if res.get("published_date"):
+        result["published_date"] = str(res["published_date"])
+    return result
+
+
+def legacy_prompt(results: List[Dict]) -> str:
+    """
+    The answer prompt's results block as it used to be rendered
+    """
+    formatted = []
+    for i, result in enumerate(results, 1):
+        formatted.append(f"""
+            Result {i}:
+            Title: {result['title']}
+            Content: {result['content']}
+            Source: {result['source']}
+            URL: {result['url']}
+            """)
+    return "\n".join(formatted)
+
+
+def traced(build: Callable[[], object]) -> Tuple[object, int, int]:
+    """
+    Run `build` under tracemalloc; return its value, retained and peak bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, retained, peak
+
+
+def result_overhead(args):
+    records = search_records(args.results, args.result_chars)
+    content = sum(len(r["content"]) for r in records)
+
+    print(f"{args.results} results, {args.result_chars} content chars each")
+    print(f"{'representation':<16} {'built B/result':>15} {'reloaded B/result':>18}")
+    dumped = json.dumps([legacy_result(r) for r in records])
+    for name, build in (("dict", legacy_result), ("ResearchResult", ResearchResult.from_dict)):
+        # Built from search records: content strings are the records' own
+        _, built, _ = traced(lambda: [build(r) for r in records])
+        # Reloaded from JSON: the results own their content
+        _, reloaded, _ = traced(lambda: [build(r) for r in json.loads(dumped)])
+        reloaded -= sum(sys.getsizeof(r["content"]) for r in records)
+        print(f"{name:<16} {built / args.results:>15.0f} {reloaded / args.results:>18.0f}")
+    print(f"  (content itself: {content / args.results:.0f} B/result)")
+
+
+def prompt_size(args):
+    records = search_records(args.prompt_results, args.result_chars, seed=1)
+    legacy = [legacy_result(r) for r in records]
+    results = [ResearchResult.from_dict(r) for r in records]
+
+    def render_legacy():
+        return legacy_prompt(legacy), json.dumps(legacy, indent=2)
+
+    def render_compact():
+        prompt = "\n".join(result.prompt_text(i) for i, result in enumerate(results, 1))
+        return prompt, prompt  # the clarification prompt reuses the answer prompt's block
+
+    print(f"\nprompt text for {args.prompt_results} results")
+    print(f"{'rendering':<16} {'answer chars':>13} {'clarify chars':>14} {'peak KB':>9}")
+    for name, render in (("legacy", render_legacy), ("compact", render_compact)):
+        (answer, clarify), _, peak = traced(render)
+        print(f"{name:<16} {len(answer):>13,} {len(clarify):>14,} {peak / 1024:>9.0f}")
+
+
+async def batch_memory(args):
+    from benchmarks.fakes import FakeChatModel, FakeTavilyClient, install_fakes
+    from batch import run_research_batch
+    import main
+
+    install_fakes(
+        main,
+        FakeChatModel(latency=0.0, tokens_per_second=1e9, completion_tokens=256),
+        FakeTavilyClient(latency=0.0, result_chars=args.result_chars)
+    )
+    main.get_answer_agent().answer_cache = None  # every topic builds its prompt
+    topics = [{"topic": f"batch topic number {i} developments"} for i in range(args.batch_topics)]
+
+    gc.collect()
+    tracemalloc.start()
+    async for record in run_research_batch(
+        topics,
+        concurrency=args.concurrency,
+        search_type="advanced",
+        max_results=args.max_results,
+        num_queries=args.num_queries
+    ):
+        assert "answer" in record, record
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"\nbatch: {args.batch_topics} topics, advanced depth, max_results={args.max_results}, "
+          f"num_queries={args.num_queries}, concurrency={args.concurrency}")
+    print(f"  peak {peak / 2**20:.1f} MB, retained {retained / 2**20:.1f} MB (caches included)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=10000)
+    parser.add_argument("--result-chars", type=int, default=8000)
+    parser.add_argument("--prompt-results", type=int, default=15, help="results in one request's prompt")
+    parser.add_argument("--batch-topics", type=int, default=200, help="0 skips the batch run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--num-queries", type=int, default=3)
+    args = parser.parse_args()
+    result_overhead(args)
+    prompt_size(args)
+    if args.batch_topics:
+        asyncio.run(batch_memory(args))
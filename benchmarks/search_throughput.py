@@ -0,0 +1,120 @@
+"""
+Measure search throughput against the stand-in Tavily server, comparing
+the pooled async path with the old blocking call: first N concurrent raw
+searches, then N concurrent run_research_workflow requests with the LLM
+and memory faked and every search going over HTTP to the server.
+
+    python -m benchmarks.search_throughput --concurrency 32 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+import types
+from typing import Tuple
+
+import httpx
+
+# The stand-in server ignores the key, but an empty one makes an illegal auth header
+os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+
+from benchmarks.fake_tavily_server import start_server
+from tools.tavily_tool import SearchError, TavilySearchTool
+
+
+async def run_async(tool: TavilySearchTool, n: int) -> Tuple[float, int]:
+    """
+    Elapsed seconds and number of failed searches; a failed search (one
+    that raised SearchError) doesn't stop the others
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        tool._arun(query=f"query {i}", search_depth="basic", max_results=2)
+        for i in range(n)
+    ], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, SearchError):
+            raise result
+    errors = [r for r in results if isinstance(r, SearchError)]
+    if errors:
+        print("Errors:", errors[:3])
+    return elapsed, len(errors)
+
+
+async def run_blocking(base_url: str, n: int) -> float:
+    # What `_arun` used to do: a synchronous request inside the coroutine
+    async def search(client: httpx.Client, i: int):
+        return client.post("/search", json={"query": f"query {i}", "max_results": 2}).json()
+
+    start = time.perf_counter()
+    with httpx.Client(base_url=base_url) as client:
+        await asyncio.gather(*[search(client, i) for i in range(n)])
+    return time.perf_counter() - start
+
+
+async def run_workflows(base_url: str, n: int, blocking: bool, args) -> float:
+    """
+    Seconds for n concurrent research workflows, searching through the
+    research agent's own TavilySearchTool pointed at the stand-in server
+    """
+    from benchmarks.fakes import FakeChatModel, FakeTavilyClient, install_fakes
+    import main as workflow
+
+    llm = FakeChatModel(latency=args.llm_latency, tokens_per_second=1e6, completion_tokens=64)
+    install_fakes(workflow, llm, FakeTavilyClient())  # fake LLM and memory, caches cleared
+    tool = workflow.get_research_agent().tavily
+    tool.api_url = base_url
+    tool.max_concurrency = args.max_concurrency
+    tool.async_client = None  # rebuilt for this URL on first use
+    sync_client = httpx.Client(base_url=base_url)
+
+    async def blocking_search(query: str, search_depth: str, max_results: int, start_date=None) -> dict:
+        # What `_arun` used to do: a synchronous request inside the coroutine
+        return sync_client.post("/search", json={"query": query, "max_results": max_results}).json()
+
+    tool._asearch = blocking_search if blocking else types.MethodType(TavilySearchTool._asearch, tool)
+    prefix = "blocking" if blocking else "pooled"
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[
+            workflow.run_research_workflow(topic=f"{prefix} workflow topic {i}", max_tokens=64)
+            for i in range(n)
+        ])
+    finally:
+        sync_client.close()
+        await tool.aclose()
+    return time.perf_counter() - start
+
+
+async def main(args):
+    server = start_server(latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    tool = TavilySearchTool(api_url=base_url, max_concurrency=args.max_concurrency)
+
+    blocking = await run_blocking(base_url, args.concurrency)
+    pooled, failed = await run_async(tool, args.concurrency)
+    await tool.aclose()
+    if args.workflows:
+        blocking_workflows = await run_workflows(base_url, args.workflows, True, args)
+        pooled_workflows = await run_workflows(base_url, args.workflows, False, args)
+    server.shutdown()
+
+    print(f"{args.concurrency} concurrent searches, {args.latency:.3f}s server latency")
+    print(f"  blocking: {blocking:.3f}s  ({args.concurrency / blocking:.1f} req/s)")
+    print(f"  pooled:   {pooled:.3f}s  ({args.concurrency / pooled:.1f} req/s, {failed} failed)")
+    if args.workflows:
+        print(f"{args.workflows} concurrent research workflows, {args.llm_latency:.3f}s fake LLM latency")
+        print(f"  blocking: {blocking_workflows:.3f}s  ({args.workflows / blocking_workflows:.1f} workflows/s)")
+        print(f"  pooled:   {pooled_workflows:.3f}s  ({args.workflows / pooled_workflows:.1f} workflows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--workflows", type=int, default=32, help="concurrent workflows (0 = skip the workflow run)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM seconds per call")
+    main_args = parser.parse_args()
+    asyncio.run(main(main_args))
@@ -0,0 +1,110 @@
+"""
+Offline end-to-end benchmark of run_research_workflow.
+
+Swaps the LLM, Tavily and memory backends for local fakes with
+configurable latency, token rate and result size, then drives the
+workflow at each requested concurrency level. Reports p50/p95/p99
+latency, throughput and peak memory; --json writes the numbers to a file
+so runs can be compared.
+
+    python -m benchmarks.workflow_benchmark --concurrency 1,8,32 --requests 64
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.fakes import FakeChatModel, FakeTavilyClient, install_fakes
+import main
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def run_level(concurrency: int, args) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        topic = f"benchmark topic {i % args.distinct_topics if args.distinct_topics else i}"
+        async with semaphore:
+            start = time.perf_counter()
+            await main.run_research_workflow(
+                topic=topic,
+                search_type=args.search_type,
+                max_results=args.max_results,
+                max_tokens=args.completion_tokens,
+                num_queries=args.num_queries
+            )
+            latencies.append(time.perf_counter() - start)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(args.requests)])
+    elapsed = time.perf_counter() - start
+    peak_traced = None
+    if args.trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "throughput": args.requests / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_traced_mb": peak_traced / 2**20 if peak_traced is not None else None
+    }
+
+
+async def run(args):
+    llm = FakeChatModel(
+        latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens
+    )
+    search = FakeTavilyClient(latency=args.search_latency, result_chars=args.result_chars)
+
+    rows = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        install_fakes(main, llm, search)
+        rows.append(await run_level(concurrency, args))
+
+    print(f"{'conc':>5} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'req/s':>8} {'rss MB':>8} {'traced MB':>10}")
+    for row in rows:
+        traced = f"{row['peak_traced_mb']:.1f}" if row["peak_traced_mb"] is not None else "-"
+        print(f"{row['concurrency']:>5} {row['p50']:>8.3f} {row['p95']:>8.3f} {row['p99']:>8.3f} "
+              f"{row['throughput']:>8.2f} {row['peak_rss_mb']:>8.1f} {traced:>10}")
+    print(f"LLM calls: {llm.calls}, search calls: {search.calls}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--distinct-topics", type=int, default=0, help="cycle through this many topics (0 = all unique)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=256)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--result-chars", type=int, default=2000)
+    parser.add_argument("--search-type", default="basic")
+    parser.add_argument("--max-results", type=int, default=3)
+    parser.add_argument("--num-queries", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="report tracemalloc peak (slower)")
+    parser.add_argument("--json", help="write results to this JSON file")
+    asyncio.run(run(parser.parse_args()))
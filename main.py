@@ -1,99 +1,596 @@
-from typing import Dict, List, Tuple, TypedDict, Annotated
-from langgraph.graph import Graph, StateGraph
-from agents.research_agent import ResearchAgent
-from agents.answer_agent import AnswerAgent
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple, TypedDict, Annotated
+from utils.metrics import current_request, instrument, record, start_request
+from utils.results import ResearchResult
+from utils.singleflight import SingleFlight
 import asyncio
+import copy
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
 
+if TYPE_CHECKING:
+    from langgraph.graph import Graph
+    from agents.research_agent import ResearchAgent
+    from agents.answer_agent import AnswerAgent
+
+# Semantic cache: reuse stored research for a topic whose embedding lies
+# within this cosine distance and which is younger than the freshness window
+MEMORY_CACHE_ENABLED = os.getenv("MEMORY_CACHE_ENABLED", "true").lower() == "true"
+MEMORY_CACHE_MAX_DISTANCE = float(os.getenv("MEMORY_CACHE_MAX_DISTANCE", "0.1"))
+MEMORY_CACHE_MAX_AGE = float(os.getenv("MEMORY_CACHE_MAX_AGE", "21600"))
+
+# Pipelined mode: quality bar that lets answer generation start before
+# every search has returned
+PIPELINE_MODES = ("off", "early")
+PIPELINE_MIN_RESULTS = int(os.getenv("PIPELINE_MIN_RESULTS", "3"))
+PIPELINE_MIN_SCORE = float(os.getenv("PIPELINE_MIN_SCORE", "0.5"))
+PIPELINE_MIN_CHARS = int(os.getenv("PIPELINE_MIN_CHARS", "200"))
+
+# Iterative research: stop once the cheap sufficiency score reaches this
+RESEARCH_SUFFICIENCY_THRESHOLD = float(os.getenv("RESEARCH_SUFFICIENCY_THRESHOLD", "0.7"))
+RESEARCH_MAX_GAP_TERMS = int(os.getenv("RESEARCH_MAX_GAP_TERMS", "4"))
+
+# Concurrent identical requests share one workflow run
+WORKFLOW_COALESCING = os.getenv("WORKFLOW_COALESCING", "true").lower() == "true"
+workflow_flight = SingleFlight("workflow")
+
 # Define the state schema
 class AgentState(TypedDict):
     topic: str
     context: str
-    research_results: List[Dict]
+    research_results: List[ResearchResult]
     current_answer: Dict
     iteration: int
     max_iterations: int
     search_type: str
     max_results: int
     max_tokens: int
+    num_queries: int
+    cache_hit: bool
+    pipeline_mode: str
+    gaps: List[str]
+    sufficient: bool
+    rounds: List[Dict]
+    incremental: bool
+    since: float
+    search_queries: List[str]
+
+# Agents are built on first use, so importing this module doesn't pull in
+# langchain, chromadb or the API clients. Benchmarks may assign stand-ins.
+research_agent: Optional["ResearchAgent"] = None
+answer_agent: Optional["AnswerAgent"] = None
+_agents_lock = threading.Lock()
 
-# Initialize agents
-research_agent = ResearchAgent()
-answer_agent = AnswerAgent()
+def get_research_agent() -> "ResearchAgent":
+    global research_agent
+    if research_agent is None:
+        with _agents_lock:
+            if research_agent is None:
+                from agents.research_agent import ResearchAgent
+                research_agent = ResearchAgent()
+    return research_agent
+
+def get_answer_agent() -> "AnswerAgent":
+    global answer_agent
+    if answer_agent is None:
+        with _agents_lock:
+            if answer_agent is None:
+                from agents.answer_agent import AnswerAgent
+                answer_agent = AnswerAgent()
+    return answer_agent
 
 # Define the nodes
+@instrument("node.memory")
+async def memory_node(state: AgentState) -> AgentState:
+    """
+    Node for answering from stored research when a close, fresh match exists
+
+    In incremental mode a close but stale match is kept for the refresh
+    node, along with the time and search queries of the run that stored it.
+    """
+    state["cache_hit"] = False
+    if not MEMORY_CACHE_ENABLED and not state["incremental"]:
+        return state
+
+    # Vector-only: fused rank order is not distance order, and the cache
+    # decision is a distance threshold on the nearest match
+    matches = await asyncio.to_thread(
+        get_answer_agent().memory.retrieve_similar_research,
+        state["topic"],
+        1,
+        {"$and": [
+            {"search_type": state["search_type"]},
+            {"max_results": {"$gte": state["max_results"]}}
+        ]},
+        hybrid=False
+    )
+    if not matches:
+        return state
+
+    match = matches[0]
+    stored_at = match["metadata"].get("stored_at", 0)
+    close = match["distance"] <= MEMORY_CACHE_MAX_DISTANCE and match["results"]
+    if close and MEMORY_CACHE_ENABLED and time.time() - stored_at <= MEMORY_CACHE_MAX_AGE:
+        state["research_results"] = match["results"][:state["max_results"]]
+        state["cache_hit"] = True
+    elif close and state["incremental"]:
+        state["research_results"] = match["results"]
+        state["since"] = stored_at
+        state["search_queries"] = json.loads(match["metadata"].get("search_queries", "[]"))
+    record("memory_lookup", cache_hit=state["cache_hit"], distance=match["distance"], refresh=bool(state["since"]))
+    return state
+
+def round_stats(since: int = 0) -> Dict:
+    """
+    LLM and search usage of the current request since its `since`-th event
+    """
+    metrics = current_request()
+    if metrics is None:
+        return {}
+    return {
+        key: value for key, value in metrics.summary(since=since).items()
+        if key in ("llm_calls", "search_calls", "prompt_tokens", "completion_tokens")
+    }
+
+@instrument("node.research")
 async def research_node(state: AgentState) -> AgentState:
     """
     Node for performing research
+
+    The first round researches the topic; later rounds search only for the
+    gaps the sufficiency check found and merge into earlier results.
+    """
+    metrics = current_request()
+    events_before = len(metrics.events) if metrics else 0
+    start = time.perf_counter()
+
+    if state["iteration"] == 0:
+        results, query = await get_research_agent().research_topic(
+            topic=state["topic"],
+            context=state["context"],
+            max_iterations=1,  # Rounds are driven by the graph
+            search_type=state["search_type"],
+            max_results=state["max_results"],
+            num_queries=state["num_queries"]
+        )
+        new_results = results
+        state["search_queries"] = query.split("\n")
+    else:
+        results, query = await get_research_agent().research_gaps(
+            gaps=state["gaps"],
+            topic=state["topic"],
+            search_type=state["search_type"],
+            max_results=state["max_results"]
+        )
+        seen = {r.url for r in state["research_results"]}
+        seen.update(d.url for r in state["research_results"] for d in r.duplicates)
+        new_results = get_research_agent().deduplicate(
+            [r for r in results if r.url not in seen],
+            existing=state["research_results"]
+        )
+        results = state["research_results"] + new_results
+    
+    state["research_results"] = results
+    state["iteration"] += 1
+    state["rounds"] = state["rounds"] + [{
+        "round": state["iteration"],
+        "query": query,
+        "new_results": len(new_results),
+        "seconds": round(time.perf_counter() - start, 4),
+        **round_stats(events_before)
+    }]
+    return state
+
+@instrument("node.refresh")
+async def refresh_node(state: AgentState) -> AgentState:
+    """
+    Node for incrementally refreshing stale stored research.
+
+    Searches the stored run's queries for content published since that run
+    and merges new or changed results into the stored ones, instead of
+    researching the topic from scratch.
     """
-    results, query = await research_agent.research_topic(
+    metrics = current_request()
+    events_before = len(metrics.events) if metrics else 0
+    start = time.perf_counter()
+
+    agent = get_research_agent()
+    updates, query = await agent.research_updates(
         topic=state["topic"],
+        since=state["since"],
+        queries=state["search_queries"],
         context=state["context"],
-        max_iterations=1,  # Only one iteration
         search_type=state["search_type"],
         max_results=state["max_results"]
     )
-    
+    state["research_results"], new_results = agent.merge_updates(state["research_results"], updates)
+    state["search_queries"] = query.split("\n")
+    state["iteration"] += 1
+    state["rounds"] = state["rounds"] + [{
+        "round": state["iteration"],
+        "query": query,
+        "refreshed_since": datetime.fromtimestamp(state["since"]).isoformat(),
+        "new_results": new_results,
+        "seconds": round(time.perf_counter() - start, 4),
+        **round_stats(events_before)
+    }]
+    return state
+
+@instrument("node.check")
+async def check_node(state: AgentState) -> AgentState:
+    """
+    Node deciding whether another research round is worth it.
+
+    Score-based on the results already in hand, so it costs no LLM call.
+    """
+    score, gaps = get_research_agent().assess_results(
+        state["topic"], state["context"], state["research_results"], state["max_results"]
+    )
+    last_round = state["rounds"][-1]
+    state["sufficient"] = (
+        score >= RESEARCH_SUFFICIENCY_THRESHOLD
+        or not gaps
+        or state["iteration"] >= state["max_iterations"]
+        # A follow-up round that found nothing new won't do better next time
+        or (state["iteration"] > 1 and last_round["new_results"] == 0)
+    )
+    state["gaps"] = gaps[:RESEARCH_MAX_GAP_TERMS]
+    last_round["score"] = round(score, 3)
+    return state
+
+@instrument("node.remember")
+async def remember_node(state: AgentState) -> AgentState:
+    """
+    Node for writing fresh research results back to memory
+    """
+    if state["research_results"]:
+        await asyncio.to_thread(
+            get_answer_agent().memory.store_research_result,
+            state["topic"],
+            state["research_results"],
+            {
+                "search_type": state["search_type"],
+                "max_results": state["max_results"]
+            },
+            state["search_queries"]
+        )
+    return state
+
+def meets_quality_bar(results: List[ResearchResult], max_results: int) -> bool:
+    """
+    Whether enough substantial, relevant results are in to start answering
+    """
+    good = [
+        r for r in results
+        if r.score >= PIPELINE_MIN_SCORE and len(r.content) >= PIPELINE_MIN_CHARS
+    ]
+    return len(good) >= min(PIPELINE_MIN_RESULTS, max_results)
+
+@instrument("node.pipeline")
+async def pipeline_node(state: AgentState) -> AgentState:
+    """
+    Node overlapping search and answer generation.
+
+    Results stream in from the concurrent sub-query searches; once they meet
+    the quality bar the answer starts, and later results only extend the
+    stored research. If they never meet it, the answer is generated over
+    everything once the searches are done.
+    """
+    def answer(results: List[ResearchResult]) -> asyncio.Task:
+        return asyncio.ensure_future(get_answer_agent().generate_answer(
+            research_results=list(results),
+            query=state["topic"],
+            additional_context=state["context"],
+            max_tokens=state["max_tokens"]
+        ))
+
+    results: List[ResearchResult] = []
+    early, early_size = None, 0
+    try:
+        async for batch in get_research_agent().iter_research(
+            topic=state["topic"],
+            context=state["context"],
+            search_type=state["search_type"],
+            max_results=state["max_results"],
+            num_queries=state["num_queries"]
+        ):
+            results.extend(batch)
+            if early is None and meets_quality_bar(results, state["max_results"]):
+                early, early_size = answer(results), len(results)
+
+        state["current_answer"] = await (early if early is not None else answer(results))
+    except BaseException:
+        if early is not None:
+            early.cancel()
+        raise
+
+    state["current_answer"]["metadata"].update(
+        pipeline_mode=state["pipeline_mode"],
+        answered_from=early_size or len(results),
+        answered_early=early is not None
+    )
     state["research_results"] = results
     state["iteration"] += 1
     return state
 
+def route_after_memory(state: AgentState) -> str:
+    """
+    Skip research entirely on a semantic cache hit, and refresh stale
+    stored research in incremental mode.
+
+    Only a single round of several sub-queries is pipelined: one query has
+    nothing to overlap with, and iterative rounds need the check node.
+    """
+    if state["cache_hit"]:
+        return "answer"
+    if state["since"]:
+        return "refresh"
+    pipelined = state["pipeline_mode"] != "off" and state["num_queries"] > 1 and state["max_iterations"] <= 1
+    return "pipeline" if pipelined else "research"
+
+def route_after_check(state: AgentState) -> str:
+    """
+    Loop back to research until the results are sufficient or the budget is spent
+    """
+    return "remember" if state["sufficient"] else "research"
+
+def route_after_remember(state: AgentState) -> str:
+    """
+    The pipelined path has already produced its answer
+    """
+    from langgraph.graph import END
+    return END if state["current_answer"] else "answer"
+
+@instrument("node.answer")
 async def answer_node(state: AgentState) -> AgentState:
     """
     Node for generating answers
     """
-    answer = await answer_agent.generate_answer(
+    answer = await get_answer_agent().generate_answer(
         research_results=state["research_results"],
         query=state["topic"],
         additional_context=state["context"],
-        max_tokens=state["max_tokens"]
+        max_tokens=state["max_tokens"],
+        cache_ttl=answer_cache_ttl(state)
     )
+    if state["rounds"]:
+        answer["metadata"]["rounds"] = state["rounds"]
     
     state["current_answer"] = answer
     return state
 
+def answer_cache_ttl(state: AgentState) -> Optional[float]:
+    """
+    In incremental mode every run checks for new material itself, so an
+    answer stays valid for as long as its packed context is unchanged and is
+    cached with the evergreen TTL even for time-sensitive topics
+    """
+    if not state["incremental"]:
+        return None
+    from agents.answer_agent import ANSWER_CACHE_TTL
+    return ANSWER_CACHE_TTL
+
 # Create the graph
-def create_research_graph() -> Graph:
+def create_research_graph(include_answer: bool = True) -> "Graph":
     """
     Create the research workflow graph
+
+    With include_answer=False the graph stops once research results are
+    ready, so the caller can stream the answer itself.
     """
+    from langgraph.graph import END, StateGraph
+
     workflow = StateGraph(AgentState)
     
     # Add nodes
+    workflow.add_node("memory", memory_node)
     workflow.add_node("research", research_node)
-    workflow.add_node("answer", answer_node)
-    
-    # Define the end node
-    workflow.add_node("end", lambda x: x)
+    workflow.add_node("refresh", refresh_node)
+    workflow.add_node("check", check_node)
+    workflow.add_node("remember", remember_node)
+    if include_answer:
+        workflow.add_node("pipeline", pipeline_node)
+        workflow.add_node("answer", answer_node)
     
     # Add edges
-    workflow.add_edge("research", "answer")
-    workflow.add_edge("answer", "end")
+    workflow.add_conditional_edges("memory", route_after_memory, {
+        "answer": "answer" if include_answer else END,
+        "research": "research",
+        "refresh": "refresh",
+        "pipeline": "pipeline" if include_answer else "research"
+    })
+    workflow.add_edge("research", "check")
+    workflow.add_edge("refresh", "remember")
+    workflow.add_conditional_edges("check", route_after_check, {
+        "research": "research",
+        "remember": "remember"
+    })
+    if include_answer:
+        workflow.add_edge("pipeline", "remember")
+        workflow.add_conditional_edges("remember", route_after_remember, {
+            "answer": "answer",
+            END: END
+        })
+        workflow.add_edge("answer", END)
+    else:
+        workflow.add_edge("remember", END)
     
     # Set entry point
-    workflow.set_entry_point("research")
+    workflow.set_entry_point("memory")
     
     return workflow.compile()
 
+@functools.lru_cache(maxsize=None)
+def get_research_graph(include_answer: bool = True) -> "Graph":
+    """
+    Return the compiled research graph, building it on first use.
+
+    Compiled graphs keep no per-run state, so one instance is shared by
+    every request in the process.
+    """
+    return create_research_graph(include_answer=include_answer)
+
 # Main function to run the research workflow
 async def run_research_workflow(
     topic: str,
     context: str = "",
-    max_iterations: int = 1,  # Set to 1 by default
+    max_iterations: int = 1,  # Research rounds; >1 loops on gaps until sufficient
     search_type: str = "basic",  # Default to basic search
     max_results: int = 2,  # Default to 2 results
-    max_tokens: int = 256  # Default to 256 tokens
+    max_tokens: int = 256,  # Default to 256 tokens
+    num_queries: int = 1,  # >1 fans out into concurrent sub-query searches
+    pipeline_mode: str = "off",  # "early" overlaps search and answering
+    incremental: bool = False  # refresh stale stored research instead of redoing it
 ) -> Dict:
     """
     Run the complete research workflow
+
+    pipeline_mode only has an effect with num_queries > 1 and a single
+    research round (max_iterations=1):
+    - "off": answer once every search has returned
+    - "early": start (and keep) the answer as soon as results meet the quality bar
+
+    With incremental=True, a topic whose stored research is older than the
+    memory cache's freshness window is refreshed rather than researched
+    again: only content published since the last run is searched for and
+    merged in, and the answer is only regenerated when the merged results
+    change the packed context (otherwise the answer cache serves it).
+
+    Identical requests already in flight are coalesced into one run; each
+    caller gets its own copy of the answer, marked `coalesced` for callers
+    that joined a run another one started.
+    """
+    params = dict(
+        context=context,
+        max_iterations=max_iterations,
+        search_type=search_type,
+        max_results=max_results,
+        max_tokens=max_tokens,
+        num_queries=num_queries,
+        pipeline_mode=pipeline_mode,
+        incremental=incremental
+    )
+    if not WORKFLOW_COALESCING:
+        return await _run_research_workflow(topic, **params)
+
+    answer, shared = await workflow_flight.do(
+        workflow_key(topic, **params), _run_research_workflow, topic, **params
+    )
+    answer = copy.deepcopy(answer)
+    answer["metadata"]["coalesced"] = shared
+    return answer
+
+def workflow_key(topic: str, context: str = "", **params) -> Tuple:
     """
-    # Initialize the graph
-    graph = create_research_graph()
+    Normalized identity of a workflow request: equal keys get the same answer
+    """
+    return (" ".join(topic.lower().split()), " ".join(context.lower().split()), *sorted(params.items()))
+
+async def _run_research_workflow(
+    topic: str,
+    context: str,
+    max_iterations: int,
+    search_type: str,
+    max_results: int,
+    max_tokens: int,
+    num_queries: int,
+    pipeline_mode: str,
+    incremental: bool
+) -> Dict:
+    graph = get_research_graph()
+    metrics = start_request()
     
     # Initialize the state
-    initial_state: AgentState = {
+    initial_state = create_initial_state(
+        topic, context, max_iterations, search_type, max_results, max_tokens, num_queries,
+        pipeline_mode, incremental
+    )
+    
+    # Run the graph
+    final_state = await graph.ainvoke(initial_state)
+    
+    answer = final_state["current_answer"]
+    answer["metadata"]["metrics"] = metrics.summary()
+    return answer
+
+async def stream_research_workflow(
+    topic: str,
+    context: str = "",
+    max_iterations: int = 1,
+    search_type: str = "basic",
+    max_results: int = 2,
+    max_tokens: int = 256,
+    num_queries: int = 1,
+    incremental: bool = False
+) -> AsyncIterator[Dict]:
+    """
+    Run the research workflow, streaming the answer as it is generated.
+
+    Yields events in order:
+    - {"type": "sources", "sources": [...]} once research completes
+    - {"type": "token", "content": "..."} for each answer chunk
+    - {"type": "answer", "answer": {...}} with the same payload
+      run_research_workflow returns
+    """
+    graph = get_research_graph(include_answer=False)
+    metrics = start_request()
+    initial_state = create_initial_state(
+        topic, context, max_iterations, search_type, max_results, max_tokens, num_queries,
+        incremental=incremental
+    )
+    state = await graph.ainvoke(initial_state)
+
+    research_results = state["research_results"]
+    agent = get_answer_agent()
+    yield {
+        "type": "sources",
+        "sources": agent._extract_sources(research_results)
+    }
+
+    chunks = []
+    context_stats = {}
+    async for token in agent.stream_answer(
+        research_results=research_results,
+        query=topic,
+        additional_context=context,
+        max_tokens=max_tokens,
+        context_stats=context_stats,
+        cache_ttl=answer_cache_ttl(state)
+    ):
+        chunks.append(token)
+        yield {"type": "token", "content": token}
+
+    answer = agent.build_answer(
+        "".join(chunks), research_results, topic, max_tokens, context_stats
+    )
+    if state["rounds"]:
+        answer["metadata"]["rounds"] = state["rounds"]
+    answer["metadata"]["metrics"] = metrics.summary()
+    yield {"type": "answer", "answer": answer}
+
+def create_initial_state(
+    topic: str,
+    context: str,
+    max_iterations: int,
+    search_type: str,
+    max_results: int,
+    max_tokens: int,
+    num_queries: int,
+    pipeline_mode: str = "off",
+    incremental: bool = False
+) -> AgentState:
+    """
+    Build the initial graph state for a request
+    """
+    if pipeline_mode not in PIPELINE_MODES:
+        raise ValueError(f"pipeline_mode must be one of {PIPELINE_MODES}")
+    return {
         "topic": topic,
         "context": context,
         "research_results": [],
@@ -102,13 +599,17 @@ async def run_research_workflow(
         "max_iterations": max_iterations,
         "search_type": search_type,
         "max_results": max_results,
-        "max_tokens": max_tokens
+        "max_tokens": max_tokens,
+        "num_queries": num_queries,
+        "cache_hit": False,
+        "pipeline_mode": pipeline_mode,
+        "gaps": [],
+        "sufficient": False,
+        "rounds": [],
+        "incremental": incremental,
+        "since": 0.0,
+        "search_queries": []
     }
-    
-    # Run the graph
-    final_state = await graph.ainvoke(initial_state)
-    
-    return final_state["current_answer"]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+"""
+Serving layer shared by every front-end session.
+
+One long-lived event loop runs on a background thread; research requests
+are submitted to it as jobs and their events (sources, answer tokens, the
+final answer) are polled back from any thread. Identical in-flight
+requests from different sessions share one job, and a session can cancel
+its interest in a job without affecting the others: the job itself is
+only cancelled once no session is waiting on it.
+
+    server = ResearchServer()
+    job_id = server.submit("session-1", topic="...", max_results=2)
+    cursor, done = 0, False
+    while not done:
+        events, done = server.poll(job_id, cursor, timeout=0.2)
+        cursor += len(events)
+"""
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import functools
+import itertools
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from main import stream_research_workflow, workflow_key
+
+load_dotenv()
+
+SERVING_MAX_CONCURRENCY = int(os.getenv("SERVING_MAX_CONCURRENCY", "8"))
+SERVING_JOB_RETENTION = float(os.getenv("SERVING_JOB_RETENTION", "600"))
+
+
+class Job:
+    """
+    One research run and the events it has produced so far
+    """
+
+    def __init__(self, job_id: str, key: Tuple, params: Dict):
+        self.id = job_id
+        self.key = key
+        self.params = params
+        self.events: List[Dict] = []
+        self.subscribers: Set[str] = set()
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.future = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+
+class ResearchServer:
+    """
+    Background event loop running research jobs for many sessions
+    """
+
+    def __init__(self, max_concurrency: int = SERVING_MAX_CONCURRENCY, job_retention: float = SERVING_JOB_RETENTION):
+        self.max_concurrency = max_concurrency
+        self.job_retention = job_retention
+        self.jobs: Dict[str, Job] = {}
+        self.active: Dict[Tuple, Job] = {}
+        self.stats = {"submitted": 0, "coalesced": 0, "cancelled": 0, "failed": 0}
+        self._ids = itertools.count(1)
+        self._changed = threading.Condition()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="research-server", daemon=True)
+        self._thread.start()
+        self._slots = asyncio.run_coroutine_threadsafe(self._make_slots(), self.loop).result()
+
+    async def _make_slots(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def submit(self, session_id: str, topic: str, **params) -> str:
+        """
+        Start (or join an identical in-flight) research job, returning its ID
+        """
+        key = workflow_key(topic, **params)
+        with self._changed:
+            self._purge_finished()
+            self.stats["submitted"] += 1
+            job = self.active.get(key)
+            if job is not None:
+                self.stats["coalesced"] += 1
+            else:
+                job = Job(f"job-{next(self._ids)}", key, {"topic": topic, **params})
+                self.jobs[job.id] = job
+                self.active[key] = job
+                job.future = asyncio.run_coroutine_threadsafe(self._run(job), self.loop)
+                job.future.add_done_callback(functools.partial(self._on_future_done, job))
+            job.subscribers.add(session_id)
+            return job.id
+
+    async def _run(self, job: Job):
+        try:
+            async with self._slots:
+                self._update(job, status="running")
+                async for event in stream_research_workflow(**job.params):
+                    self._update(job, event=event)
+            self._update(job, status="done")
+        except asyncio.CancelledError:
+            self._update(job, status="cancelled")
+            raise
+        except Exception as e:
+            self._update(job, status="failed", event={"type": "error", "error": f"{type(e).__name__}: {e}"})
+
+    def _on_future_done(self, job: Job, future):
+        # A job cancelled before it started never reaches _run's handlers
+        if future.cancelled() and not job.done:
+            self._update(job, status="cancelled")
+
+    def _update(self, job: Job, status: Optional[str] = None, event: Optional[Dict] = None):
+        with self._changed:
+            if event is not None:
+                job.events.append(event)
+            if status is not None:
+                job.status = status
+                if status in ("done", "failed", "cancelled"):
+                    job.finished = time.time()
+                    self.stats["failed"] += status == "failed"
+                    if self.active.get(job.key) is job:
+                        del self.active[job.key]
+            self._changed.notify_all()
+
+    def poll(self, job_id: str, cursor: int = 0, timeout: float = 0.0) -> Tuple[List[Dict], bool]:
+        """
+        Events after `cursor`, waiting up to `timeout` seconds for new ones; also whether the job has finished
+        """
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            self._changed.wait_for(lambda: len(job.events) > cursor or job.done, timeout=timeout)
+            return job.events[cursor:], job.done
+
+    def status(self, job_id: str) -> str:
+        with self._changed:
+            return self.jobs[job_id].status
+
+    def cancel(self, job_id: str, session_id: str):
+        """
+        Drop this session's interest in a job; the job stops once nobody is waiting on it
+        """
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if job is None or job.done:
+                return
+            job.subscribers.discard(session_id)
+            if job.subscribers:
+                return
+            # Nobody is waiting any more: don't let a new submission join it
+            if self.active.get(job.key) is job:
+                del self.active[job.key]
+            self.stats["cancelled"] += 1
+        job.future.cancel()
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.job_retention
+        for job_id in [j.id for j in self.jobs.values() if j.done and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        """
+        Cancel running jobs and stop the background loop
+        """
+        with self._changed:
+            futures = [job.future for job in self.jobs.values() if not job.done]
+        for future in futures:
+            future.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
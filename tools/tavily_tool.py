@@ -3,13 +3,56 @@ from langchain.tools import BaseTool
 from langchain.prompts import PromptTemplate
 from tavily import TavilyClient
 from pydantic import BaseModel, Field
+import asyncio
+import httpx
 import os
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.metrics import span
+from utils.rate_limiter import call_with_retries
 
 
 from dotenv import load_dotenv
 
 load_dotenv()
 TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+TAVILY_MAX_CONCURRENCY = int(os.getenv("TAVILY_MAX_CONCURRENCY", "8"))
+TAVILY_TIMEOUT = float(os.getenv("TAVILY_TIMEOUT", "20"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR")  # unset = memory tier only
+
+
+class SearchError(Exception):
+    """
+    A search that still failed after retries
+    """
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query's case and whitespace so trivially different
+    spellings share a cache key. Symbols are kept: "C++" and "C", or "$100"
+    and "100", are different searches.
+    """
+    return " ".join(query.lower().split())
+
+
+def search_cache_key(query: str, search_depth: str, max_results: int, start_date: Optional[str] = None) -> str:
+    key = f"{normalize_query(query)}|{search_depth}|{max_results}"
+    return f"{key}|{start_date}" if start_date else key
+
+
+def create_search_cache() -> TieredCache:
+    """
+    Build the search-result cache from the SEARCH_CACHE_* settings
+    """
+    disk = None
+    if SEARCH_CACHE_DIR:
+        disk = SQLiteCache(os.path.join(SEARCH_CACHE_DIR, "search_cache.sqlite3"), ttl=SEARCH_CACHE_TTL)
+    return TieredCache(LRUCache(max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL), disk)
+
+
 class TavilySearchInput(BaseModel):
     query: str = Field(..., description="The search query to execute")
     search_depth: str = Field(
@@ -20,6 +63,10 @@ class TavilySearchInput(BaseModel):
         default=5,
         description="Maximum number of results to return"
     )
+    start_date: Optional[str] = Field(
+        default=None,
+        description="Only return results published on or after this date (YYYY-MM-DD)"
+    )
 
 class TavilySearchTool(BaseTool):
     name: str = "tavily_search"
@@ -30,30 +77,153 @@ class TavilySearchTool(BaseTool):
     """
     args_schema: Type[BaseModel] = TavilySearchInput
     client: Any = Field(default=None, exclude=True)
+    api_url: str = TAVILY_API_URL
+    max_concurrency: int = TAVILY_MAX_CONCURRENCY
+    timeout: float = TAVILY_TIMEOUT
+    async_client: Any = Field(default=None, exclude=True)
+    semaphore: Any = Field(default=None, exclude=True)
+    loop: Any = Field(default=None, exclude=True)
+    cache: Any = Field(default=None, exclude=True)
+    inflight: Dict[str, Any] = Field(default_factory=dict, exclude=True)
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        if self.cache is None:
+            self.cache = create_search_cache()
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """
+        Return the pooled async client for the running event loop.
+
+        httpx connection pools and asyncio semaphores are bound to the loop
+        they were created on, so a fresh pair is built whenever the tool is
+        used from a different loop (e.g. one `asyncio.run` per Streamlit run).
+        """
+        loop = asyncio.get_running_loop()
+        if self.async_client is None or self.loop is not loop:
+            self.async_client = httpx.AsyncClient(
+                base_url=self.api_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.loop = loop
+        return self.async_client
+
+    async def _asearch(self, query: str, search_depth: str, max_results: int, start_date: Optional[str] = None) -> Dict:
+        """
+        POST a search to the Tavily REST API over the pooled client
+        """
+        api_key = os.getenv("TAVILY_API_KEY", "")
+        if not api_key:
+            raise SearchError("TAVILY_API_KEY is not set")
+        client = self._get_async_client()
+        payload = {
+            "api_key": api_key,
+            "query": query,
+            "search_depth": search_depth,
+            "max_results": max_results
+        }
+        if start_date:
+            payload["start_date"] = start_date
+        async with self.semaphore:
+            response = await client.post(
+                "/search",
+                json=payload,
+                headers={"Authorization": f"Bearer {api_key}"}
+            )
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        """
+        Close the pooled async client
+        """
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+            self.loop = None
         
-    def _run(self, query: str, search_depth: str = "advanced", max_results: int = 5) -> List[Dict]:
+    def _run(self,
+             query: str,
+             search_depth: str = "advanced",
+             max_results: int = 5,
+             start_date: Optional[str] = None) -> List[Dict]:
         """
         Execute the search using Tavily API
         """
+        key = search_cache_key(query, search_depth, max_results, start_date)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
         try:
             search_result = self.client.search(
                 query=query,
                 search_depth=search_depth,
-                max_results=max_results
+                max_results=max_results,
+                **({"start_date": start_date} if start_date else {})
             )
-            return search_result.get("results", [])
+            results = search_result.get("results", [])
         except Exception as e:
             return [{"error": str(e)}]
+        self.cache.set(key, results)
+        return results
     
-    async def _arun(self, query: str, search_depth: str = "advanced", max_results: int = 5) -> List[Dict]:
+    async def _arun(self,
+                    query: str,
+                    search_depth: str = "advanced",
+                    max_results: int = 5,
+                    start_date: Optional[str] = None) -> List[Dict]:
         """
         Async implementation of the search
+
+        `start_date` (YYYY-MM-DD) restricts results to content published since then.
         """
-        return self._run(query, search_depth, max_results)
+        with span("search", search_depth=search_depth) as event:
+            key = search_cache_key(query, search_depth, max_results, start_date)
+            cached = self.cache.get(key)
+            if cached is not None:
+                event.update(results=len(cached), cache_hit=True)
+                return cached
+
+            # Identical searches already in flight share one request
+            task = self.inflight.get(key)
+            shared = task is not None and task.get_loop() is asyncio.get_running_loop()
+            if not shared:
+                task = asyncio.ensure_future(self._fetch(key, query, search_depth, max_results, start_date))
+                self.inflight[key] = task
+                task.add_done_callback(lambda _: self.inflight.pop(key, None))
+            event["cache_hit"] = shared
+            try:
+                results = await asyncio.shield(task)
+            except SearchError:
+                event["error"] = True
+                raise
+            event["results"] = len(results)
+            return results
+
+    async def _fetch(self,
+                     key: str,
+                     query: str,
+                     search_depth: str,
+                     max_results: int,
+                     start_date: Optional[str] = None) -> List[Dict]:
+        """
+        Search under the shared Tavily limiter, retrying 429s, 5xx and timeouts
+        """
+        # start_date is only passed when set, so plain searches keep the three-argument call
+        extra = {"start_date": start_date} if start_date else {}
+        try:
+            search_result = await call_with_retries("tavily", self._asearch, query, search_depth, max_results, **extra)
+        except Exception as e:
+            raise SearchError(f"Search failed for {query!r}: {str(e) or type(e).__name__}") from e
+        results = search_result.get("results", [])
+        self.cache.set(key, results)
+        return results
 
 # Advanced query generation prompt
 QUERY_GENERATION_PROMPT = PromptTemplate(
@@ -0,0 +1,181 @@
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+import math
+import os
+import re
+
+from dotenv import load_dotenv
+
+from utils.results import ResearchResult
+
+load_dotenv()
+
+ANSWER_CONTEXT_TOKEN_BUDGET = int(os.getenv("ANSWER_CONTEXT_TOKEN_BUDGET", "3000"))
+PASSAGE_TOKENS = int(os.getenv("PASSAGE_TOKENS", "150"))
+
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have how in is it its of on or that the
+this to was were what when where which who why will with about into than then
+""".split())
+
+
+def tokenize_words(text: str) -> List[str]:
+    """
+    Lowercased word tokens without stopwords, used for relevance ranking
+    """
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class ContextPacker:
+    """
+    Packs research results into a fixed input-token budget.
+
+    Each result's content is split into passages of roughly
+    `passage_tokens` tokens, passages are ranked against the query with
+    BM25, and the best ones are kept until the budget is spent. Kept
+    passages are returned in their original order within each result.
+    """
+
+    def __init__(self,
+                 token_budget: int = ANSWER_CONTEXT_TOKEN_BUDGET,
+                 passage_tokens: int = PASSAGE_TOKENS,
+                 encoding: str = "o200k_base"):
+        self.token_budget = token_budget
+        self.passage_tokens = passage_tokens
+        self.encoding = encoding
+        self._encoder = False  # not loaded yet
+
+    @property
+    def encoder(self):
+        """
+        The tiktoken encoder, loaded on first use; None falls back to a character-based estimate
+        """
+        if self._encoder is False:
+            try:
+                import tiktoken
+                self._encoder = tiktoken.get_encoding(self.encoding)
+            except Exception:
+                self._encoder = None
+        return self._encoder
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoder is not None:
+            return len(self.encoder.encode(text, disallowed_special=()))
+        return max(1, len(text) // 4) if text else 0
+
+    def split_passages(self, text: str) -> List[Tuple[str, int]]:
+        """
+        Split text into (passage, token_count) pairs on paragraph and sentence boundaries
+        """
+        passages = []
+        for paragraph in re.split(r"\n\s*\n|\n", text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            tokens = self.count_tokens(paragraph)
+            if tokens <= self.passage_tokens:
+                passages.append((paragraph, tokens))
+                continue
+
+            current, current_tokens = [], 0
+            for sentence in _SENTENCE_RE.split(paragraph):
+                sentence_tokens = self.count_tokens(sentence)
+                if current and current_tokens + sentence_tokens > self.passage_tokens:
+                    passages.append((" ".join(current), current_tokens))
+                    current, current_tokens = [], 0
+                if sentence_tokens > self.passage_tokens:
+                    passages.extend(self._split_long(sentence))
+                    continue
+                current.append(sentence)
+                current_tokens += sentence_tokens
+            if current:
+                passages.append((" ".join(current), current_tokens))
+        return passages
+
+    def _split_long(self, sentence: str) -> List[Tuple[str, int]]:
+        """
+        Hard-split a sentence longer than one passage on word boundaries
+        """
+        words = sentence.split()
+        # Words per chunk, scaled from this sentence's own tokens-per-word ratio
+        step = max(1, int(len(words) * self.passage_tokens / self.count_tokens(sentence)))
+        chunks = []
+        for start in range(0, len(words), step):
+            chunk = " ".join(words[start:start + step])
+            chunks.append((chunk, self.count_tokens(chunk)))
+        return chunks
+
+    def pack(self,
+             results: List[ResearchResult],
+             query: str,
+             token_budget: Optional[int] = None) -> Tuple[List[ResearchResult], Dict]:
+        """
+        Return results with content trimmed to the best passages, plus token stats
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+
+        passages = []  # (result_index, position, text, tokens, terms)
+        for i, result in enumerate(results):
+            for position, (text, tokens) in enumerate(self.split_passages(result.content)):
+                passages.append((i, position, text, tokens, Counter(tokenize_words(text))))
+
+        original_tokens = sum(p[3] for p in passages)
+        if original_tokens <= budget:
+            return results, {
+                "context_tokens": original_tokens,
+                "context_tokens_original": original_tokens,
+                "context_tokens_saved": 0,
+                "passages_kept": len(passages),
+                "passages_total": len(passages)
+            }
+
+        scores = self._bm25(passages, tokenize_words(query))
+
+        # Prefer relevant passages; break ties by result rank then position
+        order = sorted(range(len(passages)), key=lambda j: (-scores[j], passages[j][0], passages[j][1]))
+        kept, used = set(), 0
+        for j in order:
+            tokens = passages[j][3]
+            if used + tokens <= budget:
+                kept.add(j)
+                used += tokens
+
+        selected: Dict[int, List[str]] = {}
+        for j in sorted(kept):
+            selected.setdefault(passages[j][0], []).append(passages[j][2])
+
+        packed = [
+            result.with_content("\n".join(selected[i]))
+            for i, result in enumerate(results)
+            if i in selected
+        ]
+        return packed, {
+            "context_tokens": used,
+            "context_tokens_original": original_tokens,
+            "context_tokens_saved": original_tokens - used,
+            "passages_kept": len(kept),
+            "passages_total": len(passages)
+        }
+
+    def _bm25(self, passages: List[tuple], query_terms: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+        if not query_terms:
+            return [0.0] * len(passages)
+        n = len(passages)
+        lengths = [sum(p[4].values()) or 1 for p in passages]
+        avg_length = sum(lengths) / n
+        doc_freq = Counter(term for p in passages for term in set(p[4]) if term in query_terms)
+        idf = {
+            term: math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            for term in set(query_terms)
+        }
+        scores = []
+        for p, length in zip(passages, lengths):
+            score = 0.0
+            for term, weight in idf.items():
+                tf = p[4].get(term, 0)
+                if tf:
+                    score += weight * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+            scores.append(score)
+        return scores
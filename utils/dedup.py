@@ -0,0 +1,169 @@
+from typing import Dict, List, Optional, Sequence
+from collections import defaultdict
+from itertools import chain
+import os
+import re
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.results import ResearchResult, Source
+
+load_dotenv()
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.5"))  # estimated Jaccard of word 3-grams
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLES_PER_CHUNK = 1 << 16
+_GRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def shingle_ids(texts: List[str], size: int = 3) -> List[np.ndarray]:
+    """
+    Word `size`-gram IDs of each text.
+
+    Words are numbered per call and n-grams combined arithmetically, so
+    IDs are only comparable between texts shingled together.
+    """
+    tokenized = [_WORD_RE.findall(text.lower()) for text in texts]
+    all_words = list(chain.from_iterable(tokenized))
+    vocabulary = {word: i for i, word in enumerate(dict.fromkeys(all_words))}
+    ids = np.fromiter(map(vocabulary.__getitem__, all_words), dtype=np.uint64, count=len(all_words))
+
+    shingles = []
+    offset = 0
+    for words in tokenized:
+        words, offset = ids[offset:offset + len(words)], offset + len(words)
+        width = min(size, len(words))
+        grams = np.zeros(len(words) - width + 1 if len(words) else 0, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for k in range(width):
+                grams = grams * _GRAM_MULTIPLIER + words[k:len(grams) + k]
+        shingles.append(grams)
+    return shingles
+
+
+class NearDuplicateFilter:
+    """
+    Collapses search results whose contents are near-identical.
+
+    Contents are shingled into word n-grams and summarised with MinHash
+    (multiply-shift hashes, vectorized over all shingles at once). LSH
+    banding proposes candidate pairs; pairs whose estimated Jaccard
+    similarity reaches `threshold` are merged. The first result of each
+    group is kept and the others are attached to it as `duplicates`, so
+    every URL can still be cited.
+
+    A mirror with 5% of its words changed keeps only ~86% of its 3-grams
+    (Jaccard ~0.75 to the original, ~0.58 between two mirrors), so the
+    defaults are a 0.5 threshold and 32 bands of 2 rows, which proposes
+    pairs from about Jaccard 0.2 up.
+    """
+
+    def __init__(self,
+                 threshold: float = DEDUP_THRESHOLD,
+                 num_perm: int = 64,
+                 bands: int = 32,
+                 shingle_size: int = 3,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Odd multipliers make x -> (a * x + b) mod 2**64 a permutation
+        self._a = rng.integers(1, 2**63, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=(num_perm, 1), dtype=np.uint64)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        MinHash signature matrix of shape (len(texts), num_perm); empty texts get all-max rows
+        """
+        shingles = shingle_ids(texts, self.shingle_size)
+        lengths = np.fromiter((len(s) for s in shingles), dtype=np.int64, count=len(shingles))
+        signatures = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+
+        # Hash a bounded number of shingles at a time to cap the (num_perm x shingles) buffer
+        start = 0
+        while start < len(texts):
+            end, total = start, 0
+            while end < len(texts) and (end == start or total + lengths[end] <= _SHINGLES_PER_CHUNK):
+                total += lengths[end]
+                end += 1
+            nonempty = np.flatnonzero(lengths[start:end])
+            if len(nonempty):
+                flat = np.concatenate(shingles[start:end])
+                with np.errstate(over="ignore"):
+                    hashed = ((self._a * flat + self._b) >> np.uint64(32)).astype(np.uint32)
+                offsets = np.concatenate(([0], np.cumsum(lengths[start:end])[:-1]))[nonempty]
+                signatures[start + nonempty] = np.minimum.reduceat(hashed, offsets, axis=1).T
+            start = end
+        return signatures
+
+    def groups(self, texts: List[str]) -> List[int]:
+        """
+        Group index per text: texts in the same group are near-duplicates
+        """
+        parent = list(range(len(texts)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        signatures = self.signatures(texts)
+        has_content = [bool(text.strip()) for text in texts]
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            buckets = defaultdict(list)
+            for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+                if has_content[i]:
+                    buckets[key.tobytes()].append(i)
+            for members in buckets.values():
+                for other in members[1:]:
+                    first, root = find(members[0]), find(other)
+                    if first == root:
+                        continue
+                    similarity = np.mean(signatures[members[0]] == signatures[other])
+                    if similarity >= self.threshold:
+                        parent[max(first, root)] = min(first, root)
+        return [find(i) for i in range(len(texts))]
+
+    def dedupe(self,
+               results: List[ResearchResult],
+               existing: Sequence[ResearchResult] = ()) -> List[ResearchResult]:
+        """
+        Keep the first of each group of near-duplicate results, in order.
+
+        `existing` are results kept earlier (e.g. from a previous batch).
+        Later members of a group are attached to its first result's
+        `duplicates` in place and not returned.
+        """
+        combined = [*existing, *results]
+        if len(combined) < 2:
+            return list(results)
+        group_of = self.groups([r.content for r in combined])
+        keepers: Dict[int, ResearchResult] = {}
+        for i, result in enumerate(existing):
+            keepers.setdefault(group_of[i], result)
+
+        kept = []
+        for i, result in enumerate(results, len(existing)):
+            group = group_of[i]
+            if group not in keepers:
+                keepers[group] = result
+                kept.append(result)
+                continue
+            keepers[group].duplicates.extend([Source(result.title, result.url), *result.duplicates])
+        return kept
+
+
+def create_dedup_filter() -> Optional[NearDuplicateFilter]:
+    """
+    Build the near-duplicate filter from the DEDUP_* settings
+    """
+    return NearDuplicateFilter() if DEDUP_ENABLED else None
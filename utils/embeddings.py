@@ -0,0 +1,282 @@
+"""
+CPU embedding layer for ResearchMemory.
+
+MEMORY_EMBEDDING selects the model:
+- "default": Chroma's bundled ONNX all-MiniLM-L6-v2
+- "hashing": signed feature hashing of word unigrams and bigrams in NumPy,
+  with no model download; much faster, but only lexical similarity
+
+Either model is called in batches, behind a persistent content-hash ->
+vector cache, so documents and queries seen before are never re-embedded,
+even across restarts or by another process sharing the cache directory.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import os
+import threading
+import zlib
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within a process
+    fcntl = None
+
+from utils.context_packer import tokenize_words
+from utils.metrics import span
+
+load_dotenv()
+
+MEMORY_EMBEDDING = os.getenv("MEMORY_EMBEDDING", "default")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))  # hashing model only
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./data/embeddings")  # empty = no cache
+
+_KEY_CHARS = 32
+_BIGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def embedding_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:_KEY_CHARS]
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing embedder: each word and word bigram adds a +-1 to one
+    of `dim` buckets (sign and bucket from its hash), counts are damped
+    with log1p and rows L2-normalized, so cosine distance compares
+    vocabulary overlap.
+
+    A batch is vectorized: every distinct word is hashed once (CRC32, so
+    vectors are stable across restarts), bigram hashes are mixed from word
+    hashes in NumPy, and one bincount builds the whole matrix.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        counts, words = [], []
+        for text in texts:
+            tokens = tokenize_words(text)
+            counts.append(len(tokens))
+            words.extend(tokens)
+
+        vocabulary = {word: i for i, word in enumerate(dict.fromkeys(words))}
+        word_hashes = np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in vocabulary), dtype=np.uint64, count=len(vocabulary)
+        )
+        ids = np.fromiter(map(vocabulary.__getitem__, words), dtype=np.int64, count=len(words))
+        unigrams = word_hashes[ids]
+        rows = np.repeat(np.arange(len(texts)), counts)
+
+        # Bigrams of neighbouring words within the same text
+        same_text = rows[:-1] == rows[1:]
+        bigrams = (unigrams[:-1][same_text] * _BIGRAM_MULTIPLIER + unigrams[1:][same_text]) >> np.uint64(32)
+        hashes = np.concatenate([unigrams, bigrams])
+        rows = np.concatenate([rows, rows[:-1][same_text]])
+
+        buckets = (hashes % np.uint64(self.dim)).astype(np.int64)
+        signs = np.where(hashes & np.uint64(0x80000000), -1.0, 1.0)
+        matrix = np.bincount(
+            rows * self.dim + buckets, weights=signs, minlength=len(texts) * self.dim
+        ).reshape(len(texts), self.dim)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+
+        norms = np.linalg.norm(matrix, axis=1)
+        # Texts without words still need a non-zero vector for cosine distance
+        empty = norms == 0
+        matrix[empty, 0], norms[empty] = 1.0, 1.0
+        return (matrix / norms[:, None]).astype(np.float32)
+
+
+class EmbeddingCache:
+    """
+    Persistent content-hash -> vector map, safe to share between processes
+    (e.g. the app and a batch run on the same directory).
+
+    Each row of an append-only file holds a key next to its vector, and a
+    row is only served when its stored key matches the one asked for, so
+    an interleaved or torn write can cost a miss but never return another
+    text's vector. Appends hold an exclusive lock on the file (flock, where
+    available) and first read the rows other processes appended since.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dim = dim
+        self.path = os.path.join(directory, "rows.bin")
+        self._dtype = np.dtype([("key", np.uint8, (_KEY_CHARS // 2,)), ("vector", "<f4", (dim,))])
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._index: Dict[str, int] = {}
+        self._rows = 0  # rows of the file read into the index
+        self._mapped: Optional[np.memmap] = None
+        open(self.path, "ab").close()
+        self._scan()
+
+    def _scan(self):
+        """
+        Index complete rows appended since the last scan, by any process
+        """
+        rows = os.path.getsize(self.path) // self._dtype.itemsize
+        if rows <= self._rows:
+            return
+        self._mapped = np.memmap(self.path, dtype=self._dtype, mode="r", shape=(rows,))
+        for row, key in enumerate(self._keys(self._mapped["key"][self._rows:rows]), self._rows):
+            self._index.setdefault(key, row)
+        self._rows = rows
+
+    @staticmethod
+    def _key_bytes(keys: Sequence[str]) -> np.ndarray:
+        return np.frombuffer(bytes.fromhex("".join(keys)), dtype=np.uint8).reshape(len(keys), -1)
+
+    @staticmethod
+    def _keys(stored: np.ndarray) -> List[str]:
+        text = stored.tobytes().hex()
+        return [text[i:i + _KEY_CHARS] for i in range(0, len(text), _KEY_CHARS)]
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, keys: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Vectors for `keys` (zero rows where missing) and the positions that missed
+        """
+        with self._lock:
+            rows = [self._index.get(key, -1) for key in keys]
+            found = [i for i, row in enumerate(rows) if row >= 0]
+            vectors = np.zeros((len(keys), self.dim), dtype=np.float32)
+            if found:
+                stored = self._mapped[[rows[i] for i in found]]
+                matches = (stored["key"] == self._key_bytes([keys[i] for i in found])).all(axis=1)
+                for i in np.asarray(found)[~matches]:
+                    self._index.pop(keys[i], None)
+                    rows[i] = -1
+                vectors[np.asarray(found)[matches]] = stored["vector"][matches]
+            missing = [i for i, row in enumerate(rows) if row < 0]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        with self._lock, open(self.path, "r+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file closes
+            self._scan()
+            # Positions of the first occurrence of each key not stored yet
+            new, seen = [], set()
+            for i, key in enumerate(keys):
+                if key not in self._index and key not in seen:
+                    seen.add(key)
+                    new.append(i)
+            if not new:
+                return
+            records = np.zeros(len(new), dtype=self._dtype)
+            records["key"] = self._key_bytes([keys[i] for i in new])
+            records["vector"] = np.asarray(vectors, dtype=np.float32)[new]
+            # Drop a partial row left by a crashed writer, then append whole rows
+            start = self._rows
+            f.truncate(start * self._dtype.itemsize)
+            f.seek(start * self._dtype.itemsize)
+            f.write(records.tobytes())
+            f.flush()
+            self._scan()
+
+    def stats(self) -> Dict:
+        return {"size": len(self._index), "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddingFunction:
+    """
+    Batched, cached embedding function usable as a Chroma embedding_function.
+
+    The underlying model is built by `factory` on the first cache miss.
+    """
+
+    def __init__(self,
+                 name: str,
+                 dim: int,
+                 factory: Callable[[], Callable[[List[str]], Sequence]],
+                 cache: Optional[EmbeddingCache] = None,
+                 batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.model_name = name
+        self.dim = dim
+        self._factory = factory
+        self._model = None
+        self.cache = cache
+        self.batch_size = batch_size
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._factory()
+        return self._model
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        (len(texts), dim) float32 matrix; only texts missing from the cache are computed
+        """
+        texts = list(texts)
+        keys = [embedding_key(text) for text in texts]
+        with span("embedding", texts=len(texts)) as event:
+            if self.cache is not None:
+                vectors, missing = self.cache.get_many(keys)
+            else:
+                vectors, missing = np.zeros((len(texts), self.dim), dtype=np.float32), list(range(len(texts)))
+            # Identical texts within a call are embedded once
+            unique = list({keys[i]: i for i in missing}.values())
+            computed = np.zeros((len(unique), self.dim), dtype=np.float32)
+            for start in range(0, len(unique), self.batch_size):
+                batch = [texts[i] for i in unique[start:start + self.batch_size]]
+                computed[start:start + len(batch)] = np.asarray(self.model(batch), dtype=np.float32)
+            if unique:
+                rows = {keys[i]: row for row, i in enumerate(unique)}
+                vectors[missing] = computed[[rows[keys[i]] for i in missing]]
+                if self.cache is not None:
+                    self.cache.put_many([keys[i] for i in unique], computed)
+            event.update(computed=len(unique))
+        return vectors
+
+    # Chroma embedding-function interface
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        return list(self.embed(input))
+
+    embed_query = __call__
+
+    def name(self) -> str:
+        # Not the bare model name: "default" is Chroma's own embedding function
+        return f"cached_{self.model_name}"
+
+    def get_config(self) -> Dict:
+        return {"dim": self.dim}
+
+    def is_legacy(self) -> bool:
+        return False
+
+
+def _default_model():
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+    return DefaultEmbeddingFunction()
+
+
+EMBEDDERS: Dict[str, Tuple[Callable[[], Callable], int]] = {
+    "default": (_default_model, 384),
+    "hashing": (lambda: HashingEmbedder(EMBEDDING_DIM), EMBEDDING_DIM),
+}
+
+
+def get_embedding_function(name: str = MEMORY_EMBEDDING, cache_dir: Optional[str] = EMBEDDING_CACHE_DIR) -> CachedEmbeddingFunction:
+    """
+    Build the MEMORY_EMBEDDING model behind its on-disk vector cache
+    """
+    if name not in EMBEDDERS:
+        raise ValueError(f"unknown MEMORY_EMBEDDING {name!r}; expected one of {sorted(EMBEDDERS)}")
+    factory, dim = EMBEDDERS[name]
+    cache = EmbeddingCache(os.path.join(cache_dir, f"{name}-{dim}"), dim) if cache_dir else None
+    return CachedEmbeddingFunction(name, dim, factory, cache)
@@ -0,0 +1,245 @@
+"""
+In-memory BM25 index over stored passages, and the pieces hybrid retrieval
+shares with it: Chroma-style `where` filters evaluated in Python and
+reciprocal rank fusion.
+
+Vector search misses exact entity names, version numbers and dates
+("April 2025"); BM25 over the same documents catches them, and fusing the
+two rankings keeps the semantic matches too.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import Counter
+import math
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.context_packer import tokenize_words
+
+load_dotenv()
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_COMPARISONS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """
+    Evaluate a Chroma `where` filter ($and/$or, $eq/$ne, $gt/$gte/$lt/$lte,
+    $in/$nin, or a bare value for equality) against one metadata dict
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            try:
+                if not all(_COMPARISONS[op](value, operand) for op, operand in condition.items()):
+                    return False
+            except TypeError:  # e.g. comparing a string to a number
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked ID lists: each ID scores sum(1 / (k + rank)) over the
+    rankings it appears in (rank from 1); best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class BM25Index:
+    """
+    Incremental BM25 index keyed by document ID.
+
+    Postings are appended as documents arrive and compiled to NumPy arrays
+    per term on first use, so a query is a few array gathers, one bincount
+    over the document slots and a partial sort for the top k. Removed
+    documents are only marked dead; their postings are pruned once the
+    dead outnumber the live.
+    Metadata is kept for `where` filters, which are only evaluated on
+    documents that matched the query terms.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict]] = []
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._total_length = 0.0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Optional[Sequence[Dict]] = None):
+        """
+        Index documents, replacing any already indexed under the same ID
+        """
+        with self._lock:
+            self.remove([doc_id for doc_id in ids if doc_id in self._slots])
+            for i, (doc_id, document) in enumerate(zip(ids, documents)):
+                terms = Counter(tokenize_words(document or ""))
+                slot = len(self._ids)
+                if slot >= len(self._lengths):
+                    self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+                    self._alive = np.concatenate([self._alive, np.zeros_like(self._alive)])
+                self._slots[doc_id] = slot
+                self._ids.append(doc_id)
+                self._metadatas.append(dict(metadatas[i]) if metadatas else {})
+                length = sum(terms.values())
+                self._lengths[slot] = length
+                self._alive[slot] = True
+                self._total_length += length
+                for term, tf in terms.items():
+                    slots, tfs = self._postings.setdefault(term, ([], []))
+                    slots.append(slot)
+                    tfs.append(tf)
+                    self._compiled.pop(term, None)
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                slot = self._slots.pop(doc_id, None)
+                if slot is None:
+                    continue
+                self._total_length -= float(self._lengths[slot])
+                self._alive[slot] = False
+                self._ids[slot] = None
+                self._metadatas[slot] = None
+                self._dead += 1
+            if self._dead > max(len(self._slots), 1024):
+                self._prune()
+
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        """
+        Merge metadata updates, as Chroma's update does
+        """
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                slot = self._slots.get(doc_id)
+                if slot is not None:
+                    self._metadatas[slot].update(metadata)
+
+    def metadata(self, doc_id: str) -> Optional[Dict]:
+        slot = self._slots.get(doc_id)
+        return None if slot is None else self._metadatas[slot]
+
+    def clear(self):
+        with self._lock:
+            self.__init__(self.k1, self.b)
+
+    def _prune(self):
+        """
+        Drop postings of dead documents and renumber the live ones densely
+        """
+        live = [slot for slot in range(len(self._ids)) if self._alive[slot]]
+        renumber = np.full(len(self._ids), -1, dtype=np.int64)
+        renumber[live] = np.arange(len(live))
+        postings = {}
+        for term, (slots, tfs) in self._postings.items():
+            slots_array = renumber[np.asarray(slots, dtype=np.int64)]
+            keep = slots_array >= 0
+            if keep.any():
+                postings[term] = (slots_array[keep].tolist(), np.asarray(tfs)[keep].tolist())
+        capacity = max(1024, 2 * len(live))
+        lengths, alive = np.zeros(capacity, dtype=np.float32), np.zeros(capacity, dtype=bool)
+        lengths[:len(live)] = self._lengths[live]
+        alive[:len(live)] = True
+        self._ids = [self._ids[slot] for slot in live]
+        self._metadatas = [self._metadatas[slot] for slot in live]
+        self._slots = {doc_id: slot for slot, doc_id in enumerate(self._ids)}
+        self._lengths, self._alive = lengths, alive
+        self._postings, self._compiled = postings, {}
+        self._dead = 0
+
+    def _posting(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        A term's slots, term frequencies and the length part of the BM25 norm
+        (k1 * b * doc length), compiled once per change of the term's postings
+        """
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            slots, tfs = self._postings[term]
+            slots = np.asarray(slots, dtype=np.int64)
+            compiled = self._compiled[term] = (
+                slots, np.asarray(tfs, dtype=np.float32), self.k1 * self.b * self._lengths[slots]
+            )
+        return compiled
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (id, BM25 score) for the query among documents matching `where`
+        """
+        with self._lock:
+            n = len(self._slots)
+            terms = [term for term in dict.fromkeys(tokenize_words(query)) if term in self._postings]
+            if not n or not terms or k <= 0:
+                return []
+            average_length = self._total_length / n
+            base = self.k1 * (1 - self.b)
+            slot_parts, score_parts = [], []
+            for term in terms:
+                slots, tfs, length_norm = self._posting(term)
+                if self._dead:
+                    alive = self._alive[slots]
+                    slots, tfs, length_norm = slots[alive], tfs[alive], length_norm[alive]
+                if not len(slots):
+                    continue
+                idf = math.log(1 + (n - len(slots) + 0.5) / (len(slots) + 0.5))
+                slot_parts.append(slots)
+                score_parts.append(tfs * (idf * (self.k1 + 1)) / (tfs + (base + length_norm / average_length)))
+            if not slot_parts:
+                return []
+            # Dense accumulation over all slots: cheaper than sorting postings of common terms
+            scores = np.bincount(
+                np.concatenate(slot_parts), weights=np.concatenate(score_parts), minlength=len(self._ids)
+            )
+            matched = int(np.count_nonzero(scores))
+
+            # Rank the best few first; only go further when the filter rejects too many
+            hits = []
+            window = k if where is None else 4 * k
+            ranked = 0
+            while len(hits) < k and ranked < matched:
+                window = min(window, matched)
+                top = np.argpartition(-scores, window - 1)[:window]
+                top = top[np.argsort(-scores[top], kind="stable")][ranked:]
+                for slot in top:
+                    if matches_where(self._metadatas[slot], where):
+                        hits.append((self._ids[slot], float(scores[slot])))
+                        if len(hits) == k:
+                            break
+                ranked, window = window, window * 4
+            return hits
@@ -0,0 +1,88 @@
+from typing import TYPE_CHECKING, AsyncIterator
+import functools
+import os
+
+from dotenv import load_dotenv
+
+from utils.metrics import span, usage_fields
+from utils.rate_limiter import RETRY_MAX_ATTEMPTS, backoff, call_with_retries, get_rate_limiter
+
+load_dotenv()
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Completion tokens reserved against OPENAI_TPM before the real count is known
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "512"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_chat_model(temperature: float = 0.7) -> "ChatOpenAI":
+    """
+    Process-wide chat model shared by the agents, built on first call.
+
+    Retries are scheduled by `call_with_retries` against the shared limiter,
+    so the client's own retries are turned off.
+    """
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=OPENAI_MODEL,
+        temperature=temperature,
+        stream_usage=True,
+        max_retries=0
+    )
+
+
+def estimate_tokens(messages) -> int:
+    """
+    Rough prompt size (4 characters per token) for reserving tokens/min
+    """
+    if isinstance(messages, str):
+        return len(messages) // 4
+    return sum(len(str(getattr(m, "content", m))) // 4 for m in messages)
+
+
+def _settle_tokens(reserved: int, event: dict):
+    used = event.get("prompt_tokens", 0) + event.get("completion_tokens", 0)
+    if used:
+        get_rate_limiter("openai").adjust(used - reserved)
+
+
+async def invoke_llm(llm, messages, purpose: str, **kwargs):
+    """
+    `llm.ainvoke` under the shared OpenAI limiter with retries, recorded as an "llm" event
+    """
+    reserved = estimate_tokens(messages) + LLM_COMPLETION_TOKENS_ESTIMATE
+    with span("llm", purpose=purpose) as event:
+        response = await call_with_retries("openai", llm.ainvoke, messages, tokens=reserved, **kwargs)
+        event.update(usage_fields(response))
+    _settle_tokens(reserved, event)
+    return response
+
+
+async def stream_llm(llm, messages, purpose: str) -> AsyncIterator:
+    """
+    `llm.astream` under the shared OpenAI limiter.
+
+    Failures before the first chunk are retried; once output has been
+    yielded the error is raised, since the caller has already used it.
+    """
+    reserved = estimate_tokens(messages) + LLM_COMPLETION_TOKENS_ESTIMATE
+    limiter = get_rate_limiter("openai")
+    with span("llm", purpose=purpose, prompt_tokens=0, completion_tokens=0) as event:
+        for attempt in range(RETRY_MAX_ATTEMPTS):
+            await limiter.acquire(reserved)
+            started = False
+            try:
+                async for chunk in llm.astream(messages):
+                    started = True
+                    for key, value in usage_fields(chunk).items():
+                        event[key] += value
+                    yield chunk
+                break
+            except Exception as e:
+                if started:
+                    raise
+                await backoff("openai", attempt, e)
+    _settle_tokens(reserved, event)
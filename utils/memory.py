@@ -1,72 +1,831 @@
-from typing import Dict, List, Optional
-import chromadb
-from chromadb.config import Settings
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from utils.context_packer import ContextPacker
+from utils.metrics import record
+from utils.results import ResearchResult
+from datetime import datetime
+from urllib.parse import urlparse
+import email.utils
+import hashlib
+import json
 import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows: ownership can't be checked, so compaction never runs
+    fcntl = None
+
+if TYPE_CHECKING:
+    from utils.lexical_index import BM25Index
+
 load_dotenv()
 
+MEMORY_BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "256"))
+# Retention; 0 disables each limit
+MEMORY_TTL = float(os.getenv("MEMORY_TTL", "0"))  # seconds since a document was stored
+MEMORY_MAX_IDLE = float(os.getenv("MEMORY_MAX_IDLE", "0"))  # seconds since a document was last retrieved
+MEMORY_MAX_DOCUMENTS = int(os.getenv("MEMORY_MAX_DOCUMENTS", "0"))  # least recently hit evicted first
+MEMORY_COMPACT_RATIO = float(os.getenv("MEMORY_COMPACT_RATIO", "0.2"))  # deleted/live documents that trigger compaction
+MEMORY_MAINTENANCE_INTERVAL = float(os.getenv("MEMORY_MAINTENANCE_INTERVAL", "600"))  # 0 = no background thread
+# Delete index directories Chroma leaves behind for dropped collections; reads Chroma's internal tables
+MEMORY_REMOVE_ORPHAN_INDEXES = os.getenv("MEMORY_REMOVE_ORPHAN_INDEXES", "false").lower() == "true"
+# Hybrid retrieval: BM25 and vector rankings fused with reciprocal rank fusion
+MEMORY_HYBRID_SEARCH = os.getenv("MEMORY_HYBRID_SEARCH", "true").lower() == "true"
+MEMORY_SEARCH_CANDIDATES = int(os.getenv("MEMORY_SEARCH_CANDIDATES", "20"))  # per ranking, before fusion
+MEMORY_RRF_K = int(os.getenv("MEMORY_RRF_K", "60"))
+MEMORY_SEARCH_OVERSAMPLE = int(os.getenv("MEMORY_SEARCH_OVERSAMPLE", "4"))  # unfiltered ANN candidates per result
+
+_RETIRED_SUFFIX = "_retired"
+_COMPACTING_SUFFIX = "_compacting"
+# Chroma versions whose internal `segments` table the orphan cleanup reads
+_SEGMENTS_SCHEMA_VERSIONS = ((1, 0), (2, 0))
+_UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def parse_published_date(value) -> Optional[float]:
+    """
+    Epoch seconds from a result's published date (RFC 2822 as Tavily news
+    returns it, or ISO 8601), or None
+    """
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def content_hash(*parts: str) -> str:
+    """
+    Stable ID for stored content; unlike hash() it survives restarts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:32]
+
 
 class ResearchMemory:
-    def __init__(self):
+    """
+    Research results in a Chroma collection, with retention.
+
+    Documents carry `stored_at` and `last_hit_at` metadata. Retrieval hits
+    are buffered in memory and written back by `maintain()`, which also
+    evicts by age, idle time and document count, and compacts the
+    collection once enough of it has been deleted. Compaction copies the
+    live documents (with their vectors) into a fresh collection and swaps
+    it in, so reads keep using the old collection until the swap; writes
+    made meanwhile go to both. With MEMORY_MAINTENANCE_INTERVAL set,
+    `maintain()` runs on a background thread once memory is first used.
+
+    Several processes may share one CHROMA_PERSIST_DIR. Each holds a
+    shared lock on its `memory.lock` file while it lives, and compaction
+    only runs in a process that can take it exclusively, i.e. when no
+    other process has the store open and could keep writing to the
+    collection being retired.
+    """
+
+    def __init__(self,
+                 ttl: float = MEMORY_TTL,
+                 max_idle: float = MEMORY_MAX_IDLE,
+                 max_documents: int = MEMORY_MAX_DOCUMENTS,
+                 compact_ratio: float = MEMORY_COMPACT_RATIO,
+                 maintenance_interval: float = MEMORY_MAINTENANCE_INTERVAL,
+                 hybrid: bool = MEMORY_HYBRID_SEARCH):
         self.persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./data/chroma")
-        self.client = chromadb.Client(Settings(
-            persist_directory=self.persist_dir,
-            is_persistent=True
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name="research_results",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self._client = None
+        self._collection = None
+        self._lock = threading.Lock()
+        self.passage_splitter = ContextPacker()
+        # Imported here so that importing this module (e.g. for content_hash) stays cheap
+        from utils.embeddings import get_embedding_function
+        self.embedding_function = get_embedding_function()
+        name = self.embedding_function.model_name
+        # Vectors from different models are not comparable, so each gets its own collection
+        self.collection_name = "research_results" if name == "default" else f"research_results_{name}"
+
+        self.ttl = ttl
+        self.max_idle = max_idle
+        self.max_documents = max_documents
+        self.compact_ratio = compact_ratio
+        self.maintenance_interval = maintenance_interval
+        self.hybrid = hybrid
+        self._lexical = None  # BM25 index, built from the collection on first hybrid query
+        # Serializes writes, so compaction can copy a consistent snapshot while writes continue
+        self._write_lock = threading.RLock()
+        self._shadow = None  # collection being compacted into
+        self._store_lock: Optional[int] = None  # fd of memory.lock, shared while this process uses the store
+        self._pending_hits: Dict[str, float] = {}
+        self._hits_lock = threading.Lock()
+        self._maintenance_thread = None
+        self._stop = threading.Event()
+        self.evictions = {"age": 0, "idle": 0, "size": 0}
+        self.compactions = 0
+        self.deleted_since_compaction = 0
+        self.last_maintenance: Optional[float] = None
+
+    @property
+    def client(self):
+        """
+        The persistent Chroma client, opened the first time memory is used
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+                    self._client = chromadb.Client(Settings(
+                        persist_directory=self.persist_dir,
+                        is_persistent=True
+                    ))
+        return self._client
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            client = self.client
+            with self._lock:
+                if self._collection is None:
+                    self._share_store()
+                    self._recover_compaction(client)
+                    self._collection = client.get_or_create_collection(
+                        name=self.collection_name,
+                        embedding_function=self.embedding_function,
+                        metadata={"hnsw:space": "cosine"}
+                    )
+                    self._start_maintenance()
+        return self._collection
+
+    @collection.setter
+    def collection(self, collection):
+        self._collection = collection
     
     def store_research_result(self, 
                             query: str, 
-                            results: List[Dict], 
-                            metadata: Optional[Dict] = None) -> str:
-        """
-        Store research results in the vector store
-        """
-        # Convert results to a string format for storage
-        content = str(results)
-        
-        # Generate a unique ID for this research result
-        doc_id = f"research_{hash(query + content)}"
-        
-        # Store in ChromaDB
-        self.collection.add(
-            documents=[content],
-            ids=[doc_id],
-            metadatas=[metadata or {}]
-        )
-        
+                            results: List[ResearchResult], 
+                            metadata: Optional[Dict] = None,
+                            search_queries: Optional[List[str]] = None) -> str:
+        """
+        Store research results in the vector store.
+
+        Each result is split into passages stored as their own documents with
+        URL/title/timestamp metadata, plus one query document that lists the
+        result URLs so the whole research can be found again by topic. IDs
+        are content hashes, so re-storing the same data upserts in place.
+        `search_queries` (the searches that found the results) are kept on
+        the query document for incremental refreshes, outside its ID.
+        """
+        stored_at = time.time()
+        metadata = metadata or {}
+
+        ids, documents, metadatas = [], [], []
+        seen_urls = set()
+        for result in map(ResearchResult.coerce, results):
+            url = result.url
+            if not url or url in seen_urls:
+                continue
+            seen_urls.add(url)
+            result_meta = {
+                key: value for key, value in result.to_dict().items()
+                if key not in ("content", "duplicates")
+            }
+            # Filterable fields: the result's site and publication time
+            result_meta["domain"] = urlparse(url).netloc.lower()
+            published_at = parse_published_date(result.published_date)
+            if published_at is not None:
+                result_meta["published_at"] = published_at
+            if result.duplicates:
+                result_meta["duplicates"] = json.dumps([duplicate.to_dict() for duplicate in result.duplicates])
+            chunks = self.passage_splitter.split_passages(result.content) or [("", 0)]
+            # Lets a reader tell a complete result from one missing passages
+            result_meta["passage_count"] = len(chunks)
+            for position, (passage, _) in enumerate(chunks):
+                ids.append(f"passage_{content_hash(url, str(position), passage)}")
+                documents.append(passage or result.title or url)
+                metadatas.append({
+                    **result_meta,
+                    "kind": "passage",
+                    "position": position,
+                    "stored_at": stored_at,
+                    "last_hit_at": stored_at
+                })
+
+        urls = list(dict.fromkeys(m["url"] for m in metadatas))
+        self._drop_stale_passages(urls, set(ids))
+
+        # The query document: embedded topic, pointing at its results
+        doc_id = f"research_{content_hash(query, json.dumps(metadata, sort_keys=True))}"
+        ids.append(doc_id)
+        documents.append(query)
+        metadatas.append({
+            **metadata,
+            "kind": "query",
+            "query": query,
+            "result_urls": json.dumps(urls),
+            "search_queries": json.dumps(search_queries or []),
+            "stored_at": stored_at,
+            "last_hit_at": stored_at
+        })
+
+        self._upsert(ids, documents, metadatas)
         return doc_id
+
+    def _upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        """
+        Upsert documents in batches no larger than the client allows
+        """
+        for start, end in self._batches(len(ids)):
+            self._write(
+                "upsert",
+                ids=ids[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+
+    def _batches(self, n: int):
+        batch_size = min(MEMORY_BATCH_SIZE, self.client.get_max_batch_size())
+        for start in range(0, n, batch_size):
+            yield start, min(start + batch_size, n)
+
+    def _write(self, method: str, **kwargs):
+        """
+        Apply a write to the collection, and to the compaction target if one is being built
+        """
+        with self._write_lock:
+            getattr(self.collection, method)(**kwargs)
+            if self._shadow is not None:
+                getattr(self._shadow, method)(**kwargs)
+            if self._lexical is not None:
+                if method == "upsert":
+                    self._lexical.add(kwargs["ids"], kwargs["documents"], kwargs["metadatas"])
+                elif method == "delete":
+                    self._lexical.remove(kwargs["ids"])
+                elif method == "update":
+                    self._lexical.update_metadata(kwargs["ids"], kwargs["metadatas"])
+
+    @property
+    def lexical(self) -> "BM25Index":
+        """
+        BM25 index over the collection, built on first use and then kept in
+        sync by every write.
+
+        The index lives in process memory only, so the first hybrid query of
+        each process pays for a full scan of the collection (documents and
+        metadata, page by page) and holds the write lock meanwhile; set
+        MEMORY_HYBRID_SEARCH=false where that is too costly.
+        """
+        if self._lexical is None:
+            from utils.lexical_index import BM25Index
+            with self._write_lock:
+                if self._lexical is None:
+                    index = BM25Index()
+                    batch_size = self.client.get_max_batch_size()
+                    offset = 0
+                    while True:
+                        page = self.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+                        if not page["ids"]:
+                            break
+                        index.add(page["ids"], page["documents"], page["metadatas"])
+                        offset += len(page["ids"])
+                    self._lexical = index
+        return self._lexical
+
+    def _delete(self, ids: List[str]):
+        for start, end in self._batches(len(ids)):
+            self._write("delete", ids=ids[start:end])
+        self.deleted_since_compaction += len(ids)
+
+    def _drop_stale_passages(self, urls: List[str], keep_ids: set):
+        """
+        Delete passages of these URLs that are not part of the new content
+        """
+        if not urls:
+            return
+        existing = self.collection.get(where={"url": {"$in": urls}}, include=[])
+        stale = [doc_id for doc_id in existing["ids"] if doc_id not in keep_ids]
+        if stale:
+            self._delete(stale)
+
+    def load_results(self, urls: List[str]) -> List[ResearchResult]:
+        """
+        Rebuild results for the given URLs from their stored passages;
+        a URL with passages missing is left out rather than served truncated
+        """
+        if not urls:
+            return []
+        stored = self.collection.get(
+            where={"$and": [{"kind": "passage"}, {"url": {"$in": urls}}]},
+            include=["documents", "metadatas"]
+        )
+        self._touch(stored["ids"])
+        passages: Dict[str, List] = {}
+        for doc, meta in zip(stored["documents"], stored["metadatas"]):
+            passages.setdefault(meta["url"], []).append((meta.get("position", 0), doc, meta))
+
+        results = []
+        for url in urls:
+            if url not in passages:
+                continue
+            parts = sorted(passages[url], key=lambda p: p[0])
+            meta = parts[0][2]
+            if len(parts) != meta.get("passage_count", len(parts)):
+                continue
+            results.append(ResearchResult.from_dict({
+                **meta,
+                "content": "\n".join(doc for _, doc, _ in parts),
+                "duplicates": json.loads(meta.get("duplicates", "[]"))
+            }))
+        return results
     
     def retrieve_similar_research(self, 
                                 query: str, 
-                                n_results: int = 3) -> List[Dict]:
+                                n_results: int = 3,
+                                where: Optional[Dict] = None,
+                                hybrid: Optional[bool] = None) -> List[Dict]:
+        """
+        Retrieve similar research results based on query.
+
+        `hybrid` overrides the memory's setting; vector-only matches come
+        nearest first, which a distance threshold on the top match needs.
+        """
+        where = {"$and": [{"kind": "query"}, where]} if where else {"kind": "query"}
+        matches = self._query(query, n_results, where, hybrid)
+        self._touch([match["id"] for match in matches])
+        for match in matches:
+            match["results"] = self.load_results(json.loads(match["metadata"].get("result_urls", "[]")))
+        return matches
+
+    def retrieve_passages(self,
+                          query: str,
+                          n_results: int = 5,
+                          where: Optional[Dict] = None) -> List[Dict]:
+        """
+        Retrieve the stored passages most similar to the query
+        """
+        where = {"$and": [{"kind": "passage"}, where]} if where else {"kind": "passage"}
+        passages = self._query(query, n_results, where)
+        self._touch([passage["id"] for passage in passages])
+        return passages
+
+    def _query(self, query: str, n_results: int, where: Dict, hybrid: Optional[bool] = None) -> List[Dict]:
+        """
+        Best matches for the query, fusing vector and BM25 rankings when hybrid
+        """
+        count = self.collection.count()
+        if count == 0:
+            return []
+        if not (self.hybrid if hybrid is None else hybrid):
+            return self._vector_search(query, n_results, where, count)
+
+        lexical = self.lexical
+        candidates = max(n_results, MEMORY_SEARCH_CANDIDATES)
+        vector = self._vector_ranking(query, candidates, n_results, where, count, lexical)
+        return self._fuse(query, vector, lexical.search(query, candidates, where), n_results)
+
+    def _vector_search(self, query: str, n_results: int, where: Dict, count: int) -> List[Dict]:
+        """
+        Nearest documents matching `where`.
+
+        Chroma's filtered search is far slower than a plain ANN query, so the
+        plain query runs first (oversampled) and is filtered here; the
+        filtered search is the fallback when too few survive. Documents
+        passing the filter within the unfiltered top-k are exactly the top
+        filtered ones, so the fast path loses nothing.
+        """
+        from utils.lexical_index import matches_where
+        include = ["documents", "metadatas", "distances"]
+        results = self.collection.query(
+            query_texts=[query], n_results=min(n_results * MEMORY_SEARCH_OVERSAMPLE, count), include=include
+        )
+        matches = self._rows(results)
+        filtered = [match for match in matches if matches_where(match["metadata"], where)]
+        if len(filtered) >= n_results or len(matches) == count:
+            return filtered[:n_results]
+        results = self._filtered_query(query, min(n_results, count), where, include)
+        return filtered[:n_results] if results is None else self._rows(results)
+
+    def _vector_ranking(self,
+                        query: str,
+                        candidates: int,
+                        needed: int,
+                        where: Dict,
+                        count: int,
+                        lexical: "BM25Index") -> List[Tuple[str, float]]:
         """
-        Retrieve similar research results based on query
+        (id, distance) of the nearest documents matching `where`, like
+        `_vector_search`, but filtered on the BM25 index's copy of the
+        metadata: fetching metadata from Chroma costs more than the search.
+        Hits the index doesn't know, stored by another process, are
+        added to it first.
         """
+        from utils.lexical_index import matches_where
         results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
+            query_texts=[query], n_results=min(candidates * MEMORY_SEARCH_OVERSAMPLE, count), include=["distances"]
         )
-        
+        ranked = list(zip(results["ids"][0], results["distances"][0]))
+        unknown = [doc_id for doc_id, _ in ranked if lexical.metadata(doc_id) is None]
+        if unknown:
+            self._index_unknown(unknown, lexical)
+        filtered = [
+            (doc_id, distance) for doc_id, distance in ranked
+            if matches_where(lexical.metadata(doc_id) or {}, where)
+        ]
+        if len(filtered) >= needed or len(ranked) == count:
+            return filtered[:candidates]
+        results = self._filtered_query(query, min(candidates, count), where, ["distances"])
+        if results is None:
+            return filtered[:candidates]
+        return list(zip(results["ids"][0], results["distances"][0]))
+
+    def _filtered_query(self, query: str, n_results: int, where: Dict, include: List[str]) -> Optional[Dict]:
+        """
+        Chroma's filtered search, or None when it fails on documents this
+        process's vector index hasn't loaded: another process stored them,
+        and Chroma counts and filters them but can't rank them until restart
+        """
+        from chromadb.errors import ChromaError
+        try:
+            return self.collection.query(query_texts=[query], n_results=n_results, where=where, include=include)
+        except ChromaError:
+            return None
+
+    def _index_unknown(self, ids: List[str], lexical: "BM25Index"):
+        """
+        Add documents written by another process to this process's BM25 index
+        """
+        # Under the write lock, so a local delete can't land between the get and the add
+        with self._write_lock:
+            ids = [doc_id for doc_id in ids if lexical.metadata(doc_id) is None]
+            if ids:
+                stored = self.collection.get(ids=ids, include=["documents", "metadatas"])
+                lexical.add(stored["ids"], stored["documents"], stored["metadatas"])
+
+    @staticmethod
+    def _rows(results: Dict) -> List[Dict]:
         return [
             {
                 "content": doc,
                 "metadata": meta,
-                "id": id
+                "id": id,
+                "distance": distance
             }
-            for doc, meta, id in zip(
+            for doc, meta, id, distance in zip(
                 results["documents"][0],
                 results["metadatas"][0],
-                results["ids"][0]
+                results["ids"][0],
+                results["distances"][0]
             )
         ]
+
+    def _fuse(self,
+              query: str,
+              vector: List[Tuple[str, float]],
+              lexical: List[Tuple[str, float]],
+              n_results: int) -> List[Dict]:
+        """
+        Reciprocal rank fusion of the vector and BM25 rankings, then one
+        fetch of the winners. Documents only BM25 found get their cosine
+        distance to the query computed here, so every match has a distance.
+        """
+        import numpy as np
+        from utils.lexical_index import reciprocal_rank_fusion
+        fused = reciprocal_rank_fusion(
+            [[doc_id for doc_id, _ in vector], [doc_id for doc_id, _ in lexical]], k=MEMORY_RRF_K
+        )[:n_results]
+        if not fused:
+            return []
+        distances = dict(vector)
+        need_vectors = any(doc_id not in distances for doc_id, _ in fused)
+        stored = self.collection.get(
+            ids=[doc_id for doc_id, _ in fused],
+            include=["documents", "metadatas"] + (["embeddings"] if need_vectors else [])
+        )
+        if need_vectors:
+            query_vector = np.asarray(self.embedding_function([query])[0], dtype=np.float32)
+            vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+            similarity = vectors @ query_vector / np.maximum(
+                np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector), 1e-12
+            )
+            for doc_id, sim in zip(stored["ids"], similarity):
+                distances.setdefault(doc_id, float(1 - sim))
+
+        found = {
+            doc_id: (doc, meta)
+            for doc_id, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        bm25 = dict(lexical)
+        return [
+            {
+                "content": found[doc_id][0],
+                "metadata": found[doc_id][1],
+                "id": doc_id,
+                "distance": distances[doc_id],
+                "bm25": bm25.get(doc_id, 0.0),
+                "score": score
+            }
+            for doc_id, score in fused if doc_id in found
+        ]
     
     def clear_memory(self):
         """
         Clear all stored research results
         """
-        self.collection.delete(where={}) 
\ No newline at end of file
+        with self._write_lock:
+            self._delete(self.collection.get(include=[])["ids"])
+        with self._hits_lock:
+            self._pending_hits.clear()
+
+    def _touch(self, ids: List[str]):
+        """
+        Buffer retrieval hits; `flush_hits` writes them to last_hit_at
+        """
+        now = time.time()
+        with self._hits_lock:
+            for doc_id in ids:
+                self._pending_hits[doc_id] = now
+
+    def flush_hits(self) -> int:
+        """
+        Write buffered hit times to the documents' metadata
+        """
+        with self._hits_lock:
+            hits, self._pending_hits = self._pending_hits, {}
+        ids = list(hits)
+        for start, end in self._batches(len(ids)):
+            self._write(
+                "update",
+                ids=ids[start:end],
+                metadatas=[{"last_hit_at": hits[doc_id]} for doc_id in ids[start:end]]
+            )
+        return len(ids)
+
+    def evict(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Delete stored research past the age or idle limits, then the least
+        recently hit beyond max_documents.
+
+        Eviction works on whole units so no result loses some of its
+        passages: a query document with the passages of its results, or the
+        passages of a URL no query lists. A unit counts as stored and hit
+        when its newest member was. A passage shared by several queries is
+        deleted with the last of them. Counts are of deleted documents.
+        """
+        now = now or time.time()
+        self.flush_hits()
+        stored = self.collection.get(include=["metadatas"])
+        ages, by_url, queries = {}, {}, []
+        for doc_id, meta in zip(stored["ids"], stored["metadatas"]):
+            stored_at = meta.get("stored_at", 0.0)
+            ages[doc_id] = (stored_at, meta.get("last_hit_at", stored_at))
+            if meta.get("kind") == "passage":
+                by_url.setdefault(meta.get("url"), []).append(doc_id)
+            else:
+                queries.append((doc_id, meta.get("result_urls", "[]")))
+
+        units, listed = [], set()
+        for doc_id, result_urls in queries:
+            urls = [url for url in json.loads(result_urls) if url in by_url]
+            listed.update(urls)
+            units.append([doc_id] + [passage_id for url in dict.fromkeys(urls) for passage_id in by_url[url]])
+        units.extend(ids for url, ids in by_url.items() if url not in listed)
+        holders = {doc_id: 0 for doc_id in ages}
+        for unit in units:
+            for doc_id in unit:
+                holders[doc_id] += 1
+
+        evicted = {"age": [], "idle": [], "size": []}
+        live = len(ages)
+
+        def drop(unit, reason):
+            nonlocal live
+            for doc_id in unit:
+                holders[doc_id] -= 1
+                if not holders[doc_id]:
+                    evicted[reason].append(doc_id)
+                    live -= 1
+
+        kept = []
+        for unit in units:
+            stored_at = max(ages[doc_id][0] for doc_id in unit)
+            last_hit_at = max(ages[doc_id][1] for doc_id in unit)
+            if self.ttl and stored_at < now - self.ttl:
+                drop(unit, "age")
+            elif self.max_idle and last_hit_at < now - self.max_idle:
+                drop(unit, "idle")
+            else:
+                kept.append((last_hit_at, unit[0], unit))
+        if self.max_documents and live > self.max_documents:
+            for _, _, unit in sorted(kept, key=lambda k: k[:2]):
+                if live <= self.max_documents:
+                    break
+                drop(unit, "size")
+
+        for reason, ids in evicted.items():
+            if ids:
+                self._delete(ids)
+                self.evictions[reason] += len(ids)
+        return {reason: len(ids) for reason, ids in evicted.items()}
+
+    def _share_store(self):
+        """
+        Take the shared lock on the store for the rest of this process;
+        waits while another process is compacting
+        """
+        if fcntl is None:
+            return
+        os.makedirs(self.persist_dir, exist_ok=True)
+        fd = os.open(os.path.join(self.persist_dir, "memory.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        # POSIX record locks belong to the process and convert atomically
+        # between shared and exclusive, unlike flock
+        fcntl.lockf(fd, fcntl.LOCK_SH)
+        self._store_lock = fd
+
+    @contextmanager
+    def _sole_owner(self) -> Iterator[bool]:
+        """
+        Whether no other process has the store open; if so, other processes
+        can't open it until the block ends
+        """
+        self.collection  # takes the shared lock
+        if self._store_lock is None:
+            yield False
+            return
+        try:
+            fcntl.lockf(self._store_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.lockf(self._store_lock, fcntl.LOCK_SH)
+
+    def compact(self) -> bool:
+        """
+        Rebuild the collection from its live documents and swap it in.
+
+        The copy runs batch by batch under the write lock, so each batch is
+        current, and writes in between are applied to both collections.
+        Reads are never blocked: they use the old collection until the
+        swap. The old collection is renamed aside and only dropped by the
+        next maintenance run, so reads still holding it can finish.
+        Returns False without compacting while another process has the
+        store open: its handle would keep writing to the retired collection.
+        """
+        with self._sole_owner() as sole:
+            if sole:
+                self._compact()
+        return sole
+
+    def _compact(self):
+        client, old = self.client, self.collection
+        shadow_name = f"{self.collection_name}{_COMPACTING_SUFFIX}"
+        with self._write_lock:
+            try:
+                # Left over from an interrupted compaction: stale, start afresh
+                client.delete_collection(shadow_name)
+            except Exception:
+                pass  # none left over
+            target = client.create_collection(
+                name=shadow_name,
+                embedding_function=self.embedding_function,
+                metadata=old.metadata
+            )
+            self._shadow = target
+            ids = old.get(include=[])["ids"]
+        try:
+            for start, end in self._batches(len(ids)):
+                with self._write_lock:
+                    batch = old.get(ids=ids[start:end], include=["embeddings", "documents", "metadatas"])
+                    if batch["ids"]:
+                        target.upsert(
+                            ids=batch["ids"],
+                            embeddings=batch["embeddings"],
+                            documents=batch["documents"],
+                            metadatas=batch["metadatas"]
+                        )
+            with self._write_lock:
+                old.modify(name=f"{self.collection_name}{_RETIRED_SUFFIX}")
+                target.modify(name=self.collection_name)
+                self._collection = target
+                self._shadow = None
+        except BaseException:
+            with self._write_lock:
+                self._shadow = None
+            client.delete_collection(target.name)
+            raise
+        self.compactions += 1
+        self.deleted_since_compaction = 0
+
+    def _recover_compaction(self, client):
+        """
+        Finish a compaction interrupted between its two renames
+        """
+        names = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+        if self.collection_name not in names:
+            for suffix in (_RETIRED_SUFFIX, _COMPACTING_SUFFIX):
+                if f"{self.collection_name}{suffix}" in names:
+                    client.get_collection(f"{self.collection_name}{suffix}").modify(name=self.collection_name)
+                    break
+
+    def _drop_retired(self):
+        try:
+            self.client.delete_collection(f"{self.collection_name}{_RETIRED_SUFFIX}")
+        except Exception:
+            return  # nothing retired
+        if MEMORY_REMOVE_ORPHAN_INDEXES:
+            with self._sole_owner() as sole:
+                if sole:
+                    self._remove_orphan_segments()
+
+    def _remove_orphan_segments(self):
+        """
+        Chroma leaves a deleted collection's vector index directory behind
+        and its API cannot remove it; remove index directories no segment
+        refers to any more. This reads Chroma's internal `segments` table,
+        so it is opt-in (MEMORY_REMOVE_ORPHAN_INDEXES), runs only while no
+        other process has the store open, only on the Chroma versions it
+        was checked against, and skips if the table is not as expected.
+        """
+        import chromadb
+
+        version = tuple(int(part) for part in re.findall(r"\d+", chromadb.__version__)[:2])
+        low, high = _SEGMENTS_SCHEMA_VERSIONS
+        database = os.path.join(self.persist_dir, "chroma.sqlite3")
+        if not low <= version < high or not os.path.exists(database):
+            return
+        try:
+            conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+            try:
+                live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return
+        if not live:
+            return  # the open collection always has segments
+        for name in os.listdir(self.persist_dir):
+            path = os.path.join(self.persist_dir, name)
+            if _UUID_RE.fullmatch(name) and name not in live and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def maintain(self) -> Dict:
+        """
+        One retention pass: write back hits, evict, and compact if enough was deleted
+        """
+        self._drop_retired()
+        evicted = self.evict()
+        count = self.collection.count()
+        compacted = bool(self.deleted_since_compaction) and self.deleted_since_compaction >= self.compact_ratio * max(count, 1)
+        if compacted:
+            compacted = self.compact()
+        self.last_maintenance = time.time()
+        return {"evicted": evicted, "compacted": compacted, "documents": count}
+
+    def _start_maintenance(self):
+        if self.maintenance_interval > 0 and self._maintenance_thread is None:
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, name="memory-maintenance", daemon=True
+            )
+            self._maintenance_thread.start()
+
+    def _maintenance_loop(self):
+        while not self._stop.wait(self.maintenance_interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                record("memory_maintenance_error", error=f"{type(e).__name__}: {e}")
+
+    def stop_maintenance(self):
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        """
+        Document count, on-disk size and retention counters
+        """
+        disk_bytes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(self.persist_dir) for name in names
+        )
+        with self._hits_lock:
+            pending_hits = len(self._pending_hits)
+        return {
+            "documents": self.collection.count(),
+            "disk_bytes": disk_bytes,
+            "evictions": dict(self.evictions),
+            "compactions": self.compactions,
+            "deleted_since_compaction": self.deleted_since_compaction,
+            "pending_hits": pending_hits,
+            "last_maintenance": self.last_maintenance
+        } 
\ No newline at end of file
@@ -0,0 +1,177 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import threading
+import time
+
+# Numeric event fields that are summed into counters and request summaries
+COUNTED_FIELDS = ("prompt_tokens", "completion_tokens", "results", "cache_hit", "coalesced")
+
+
+class RequestMetrics:
+    """
+    Events recorded while serving one workflow request
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events: List[Dict] = []
+
+    def summary(self, since: int = 0) -> Dict:
+        """
+        Condensed per-request view suitable for answer metadata
+
+        `since` restricts the counts to events recorded after that index,
+        e.g. to cost a single research round.
+        """
+        summary: Dict[str, Any] = {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "nodes": {},
+            "llm_calls": 0,
+            "search_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "search_results": 0,
+            "search_errors": 0,
+            "cache_hits": 0,
+            "queue_wait_seconds": 0.0,
+            "retries": 0
+        }
+        for event in self.events[since:]:
+            name = event["name"]
+            if name.startswith("node."):
+                node = name[len("node."):]
+                summary["nodes"][node] = round(summary["nodes"].get(node, 0) + event.get("seconds", 0), 4)
+            elif name == "llm":
+                summary["llm_calls"] += 1
+            elif name == "search":
+                summary["search_calls"] += 1
+                summary["search_results"] += event.get("results", 0)
+            elif name == "search_error":
+                summary["search_errors"] += 1
+            elif name.startswith("queue_wait."):
+                summary["queue_wait_seconds"] = round(summary["queue_wait_seconds"] + event["seconds"], 4)
+            elif name.startswith("retry."):
+                summary["retries"] += 1
+            summary["prompt_tokens"] += event.get("prompt_tokens", 0)
+            summary["completion_tokens"] += event.get("completion_tokens", 0)
+            summary["cache_hits"] += int(event.get("cache_hit", False))
+        return summary
+
+
+class MetricsRegistry:
+    """
+    Process-wide aggregates plus a bounded buffer of recent raw events
+    """
+
+    def __init__(self, max_events: int = 10000):
+        self._lock = threading.Lock()
+        self.events: deque = deque(maxlen=max_events)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.totals: Dict[tuple, float] = defaultdict(float)
+
+    def record(self, event: Dict):
+        with self._lock:
+            self.events.append(event)
+            name = event["name"]
+            self.counts[name] += 1
+            self.seconds[name] += event.get("seconds", 0.0)
+            for field in COUNTED_FIELDS:
+                if field in event:
+                    self.totals[(field, name)] += float(event[field])
+
+    def export_events(self) -> List[Dict]:
+        with self._lock:
+            return list(self.events)
+
+    def prometheus_text(self) -> str:
+        """
+        Render aggregates in the Prometheus text exposition format
+        """
+        with self._lock:
+            lines = [
+                "# TYPE research_events_total counter",
+                *(f'research_events_total{{event="{n}"}} {c}' for n, c in sorted(self.counts.items())),
+                "# TYPE research_event_seconds_total counter",
+                *(f'research_event_seconds_total{{event="{n}"}} {s:.6f}' for n, s in sorted(self.seconds.items())),
+            ]
+            for field in COUNTED_FIELDS:
+                values = sorted((n, v) for (f, n), v in self.totals.items() if f == field)
+                if values:
+                    lines.append(f"# TYPE research_{field}_total counter")
+                    lines.extend(f'research_{field}_total{{event="{n}"}} {v:g}' for n, v in values)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.counts.clear()
+            self.seconds.clear()
+            self.totals.clear()
+
+
+registry = MetricsRegistry()
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("research_request_metrics", default=None)
+
+
+def start_request() -> RequestMetrics:
+    """
+    Begin collecting events for the current request (and tasks it spawns)
+    """
+    metrics = RequestMetrics()
+    _current.set(metrics)
+    return metrics
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def record(name: str, **fields):
+    """
+    Record one event against the global registry and the current request
+    """
+    event = {"name": name, "time": time.time(), **fields}
+    registry.record(event)
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.events.append(event)
+
+
+@contextmanager
+def span(name: str, **fields):
+    """
+    Time a block; the yielded dict can be filled with extra event fields
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record(name, seconds=round(time.perf_counter() - start, 6), **fields)
+
+
+def instrument(name: str) -> Callable:
+    """
+    Decorator recording the wall time of an async function as `name`
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def usage_fields(message) -> Dict:
+    """
+    Prompt/completion token counts from a LangChain message, when reported
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "completion_tokens": usage.get("output_tokens", 0)
+    }
@@ -0,0 +1,236 @@
+from typing import Dict, Optional, Tuple
+from contextvars import ContextVar
+import asyncio
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from utils.metrics import record
+
+load_dotenv()
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+
+PRIORITIES = ("interactive", "batch")
+_RETRYABLE_STATUS = frozenset([408, 409, 429, 500, 502, 503, 504])
+# Matched by class name so neither openai nor httpx has to be imported here
+_RETRYABLE_ERRORS = frozenset([
+    "APIConnectionError", "APITimeoutError", "TransportError", "TimeoutError", "ConnectionError"
+])
+
+_priority: ContextVar[str] = ContextVar("request_priority", default="interactive")
+
+
+def set_request_priority(priority: str):
+    """
+    Set the limiter priority of the current task (and tasks it spawns)
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {PRIORITIES}")
+    _priority.set(priority)
+
+
+def request_priority() -> str:
+    return _priority.get()
+
+
+class RateLimiter:
+    """
+    Token buckets limiting calls per minute and LLM tokens per minute to
+    one provider.
+
+    Interactive callers reserve a slot and sleep until it comes up, so
+    waiting is fair in arrival order. Batch callers never queue behind a
+    reservation: they only take capacity that nobody has claimed, so
+    interactive requests overtake any batch backlog. State is guarded by
+    a thread lock rather than an asyncio primitive, so one limiter can be
+    shared by every event loop in the process.
+    """
+
+    def __init__(self,
+                 requests_per_minute: Optional[float] = None,
+                 burst: Optional[int] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 provider: str = ""):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self.configure(requests_per_minute, burst, tokens_per_minute)
+
+    def configure(self,
+                  requests_per_minute: Optional[float],
+                  burst: Optional[int] = None,
+                  tokens_per_minute: Optional[float] = None):
+        with self._lock:
+            self.rate = requests_per_minute / 60.0 if requests_per_minute else None
+            self.capacity = float(burst or max(1, int(self.rate or 1)))
+            self.tokens = self.capacity
+            self.token_rate = tokens_per_minute / 60.0 if tokens_per_minute else None
+            self.token_capacity = float(tokens_per_minute or 0)  # a minute's worth
+            self.token_level = self.token_capacity
+            self.paused_until = 0.0
+            self.updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.rate is not None or self.token_rate is not None or self.paused_until > time.monotonic()
+
+    def _reserve(self, tokens: int, priority: str) -> Tuple[bool, float]:
+        """
+        Try to take one request slot plus `tokens` LLM tokens.
+
+        Returns (granted, wait): a granted interactive caller must still
+        wait for its reservation to come up; a caller that was not granted
+        should sleep `wait` and try again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self.updated = now - self.updated, now
+            if self.rate:
+                self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            if self.token_rate:
+                self.token_level = min(self.token_capacity, self.token_level + elapsed * self.token_rate)
+            if now < self.paused_until:
+                return False, self.paused_until - now
+
+            tokens = min(tokens, self.token_capacity)
+            wait = 0.0
+            if self.rate and self.tokens < 1:
+                wait = (1 - self.tokens) / self.rate
+            if self.token_rate and self.token_level < tokens:
+                wait = max(wait, (tokens - self.token_level) / self.token_rate)
+            if priority == "batch" and wait > 0:
+                return False, wait
+            if self.rate:
+                self.tokens -= 1
+            if self.token_rate:
+                self.token_level -= tokens
+            return True, wait
+
+    async def acquire(self, tokens: int = 0, priority: Optional[str] = None) -> float:
+        """
+        Wait for capacity, returning the seconds spent queued
+        """
+        if not self.limited:
+            return 0.0
+        priority = priority or _priority.get()
+        start = time.monotonic()
+        while True:
+            granted, wait = self._reserve(tokens, priority)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if granted:
+                break
+        waited = time.monotonic() - start
+        record(f"queue_wait.{self.provider}", seconds=round(waited, 6), priority=priority)
+        return waited
+
+    def adjust(self, tokens: int):
+        """
+        Correct the token bucket once actual usage is known (positive = more than reserved)
+        """
+        with self._lock:
+            if self.token_rate:
+                self.token_level -= tokens
+
+    def pause(self, seconds: float):
+        """
+        Hold back every caller for a while, e.g. after the provider returned 429
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """
+    Return the process-wide limiter for a provider.
+
+    Limits come from `<PROVIDER>_RPM` and `<PROVIDER>_TPM` (e.g. OPENAI_RPM,
+    OPENAI_TPM, TAVILY_RPM); unset means unlimited.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            rpm = os.getenv(f"{provider.upper()}_RPM")
+            tpm = os.getenv(f"{provider.upper()}_TPM")
+            _limiters[provider] = RateLimiter(
+                float(rpm) if rpm else None,
+                tokens_per_minute=float(tpm) if tpm else None,
+                provider=provider
+            )
+        return _limiters[provider]
+
+
+def configure_rate_limit(provider: str,
+                         requests_per_minute: Optional[float],
+                         burst: Optional[int] = None,
+                         tokens_per_minute: Optional[float] = None):
+    """
+    Override a provider's limit at runtime (e.g. from CLI flags)
+    """
+    get_rate_limiter(provider).configure(requests_per_minute, burst, tokens_per_minute)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a failed call is worth retrying: rate limits, 5xx, timeouts and dropped connections
+    """
+    if _status_code(error) in _RETRYABLE_STATUS:
+        return True
+    return any(cls.__name__ in _RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def retry_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    Exponential backoff with full jitter, stretched to honour a Retry-After header
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        pass
+    return min(delay, RETRY_MAX_DELAY)
+
+
+async def backoff(provider: str, attempt: int, error: Exception):
+    """
+    Sleep before retrying a failed call, or re-raise `error` if it should not be retried
+    """
+    if attempt + 1 >= RETRY_MAX_ATTEMPTS or not is_retryable(error):
+        raise error
+    delay = retry_delay(attempt, error)
+    if _status_code(error) == 429:
+        get_rate_limiter(provider).pause(delay)
+    record(f"retry.{provider}", attempt=attempt + 1, delay=round(delay, 3), error=type(error).__name__)
+    await asyncio.sleep(delay)
+
+
+async def call_with_retries(provider: str, func, *args, tokens: int = 0, **kwargs):
+    """
+    Await `func(*args, **kwargs)` under the provider's limiter, retrying
+    transient failures; the last error is raised once attempts run out
+    """
+    limiter = get_rate_limiter(provider)
+    attempt = 0
+    while True:
+        await limiter.acquire(tokens)
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            await backoff(provider, attempt, e)
+            attempt += 1
@@ -0,0 +1,124 @@
+"""
+Compact, immutable representation of a search result.
+
+A result is built once from the raw search (or stored) record and then
+shared, not copied, as it moves through deduplication, packing, the graph
+state and the prompt: packing makes a copy with trimmed content, and
+deduplication attaches near-duplicates in place. Source names are
+interned, since every result shares one of a handful; prompt text is
+rendered only when a prompt is built.
+"""
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterator, List, Mapping, Union
+import sys
+
+
+def clean_title(title: str) -> str:
+    """
+    Strip the search-engine boilerplate ("... for: query", "Result for") from a title
+    """
+    if "for:" in title:
+        title = title.split("for:")[0]
+    return title.replace("Result for", "").strip()
+
+
+@dataclass(frozen=True, slots=True)
+class Source:
+    """
+    A citable page: a result or one of its collapsed near-duplicates
+    """
+    title: str
+    url: str
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"title": self.title, "url": self.url}
+
+
+@dataclass(frozen=True, slots=True)
+class ResearchResult:
+    """
+    One search result.
+
+    `duplicates` is the only mutable part: near-duplicates found after the
+    result was kept are attached to it in place, so every holder of the
+    result sees them.
+    """
+    title: str
+    url: str
+    content: str
+    source: str = "Tavily"
+    timestamp: str = ""
+    score: float = 0.0
+    published_date: str = ""
+    duplicates: List[Source] = field(default_factory=list, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "source", sys.intern(self.source))
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ResearchResult":
+        """
+        Build from a search API record or a stored/legacy result dict
+        """
+        return cls(
+            title=clean_title(str(data.get("title") or "No title")),
+            url=data.get("url") or data.get("link") or "",
+            content=data.get("content") or "",
+            source=str(data.get("source") or "Tavily"),
+            timestamp=str(data.get("timestamp") or ""),
+            score=float(data.get("score") or 0.0),
+            published_date=str(data.get("published_date") or ""),
+            duplicates=[
+                Source(str(d.get("title", "")), str(d.get("url", ""))) if isinstance(d, Mapping) else d
+                for d in data.get("duplicates") or ()
+            ]
+        )
+
+    @classmethod
+    def coerce(cls, value: Union["ResearchResult", Mapping[str, Any]]) -> "ResearchResult":
+        """
+        Accept results from callers that still pass plain dicts
+        """
+        return value if isinstance(value, cls) else cls.from_dict(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Plain dict in the shape results had before this type: optional
+        fields only when set
+        """
+        data: Dict[str, Any] = {
+            "title": self.title,
+            "content": self.content,
+            "url": self.url,
+            "source": self.source,
+            "timestamp": self.timestamp,
+            "score": self.score
+        }
+        if self.published_date:
+            data["published_date"] = self.published_date
+        if self.duplicates:
+            data["duplicates"] = [duplicate.to_dict() for duplicate in self.duplicates]
+        return data
+
+    def with_content(self, content: str) -> "ResearchResult":
+        """
+        Copy with different content, e.g. trimmed to the best passages;
+        shares the duplicates list
+        """
+        return replace(self, content=content)
+
+    def sources(self) -> Iterator[Source]:
+        """
+        This result's page followed by its near-duplicates
+        """
+        yield Source(self.title, self.url)
+        yield from self.duplicates
+
+    def prompt_text(self, index: int) -> str:
+        """
+        The result as one numbered block of the answer prompt
+        """
+        return (
+            f"Result {index}:\nTitle: {self.title}\nContent: {self.content}\n"
+            f"Source: {self.source}\nURL: {self.url}\n"
+        )
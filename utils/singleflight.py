@@ -0,0 +1,65 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+import threading
+
+from utils.metrics import record
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with equal keys into one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it
+    runs await the same task instead of repeating it. The task is shielded
+    from any one caller's cancellation and only cancelled once every
+    caller waiting on it has gone. Tasks belong to the event loop that
+    started them, so callers on another loop start their own.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Await `func(*args, **kwargs)`, sharing the run with concurrent callers
+        of the same key. Returns the result and whether it was shared, i.e.
+        another caller started the run.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.stats["calls"] += 1
+            task = self._inflight.get(key)
+            shared = task is not None and task.get_loop() is loop
+            if shared:
+                self.stats["coalesced"] += 1
+            else:
+                self.stats["executions"] += 1
+                task = loop.create_task(func(*args, **kwargs))
+                self._inflight[key] = task
+                task.add_done_callback(lambda done: self._forget(key, done))
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+        record(f"singleflight.{self.name}", coalesced=shared)
+
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            with self._lock:
+                self._waiters[task] -= 1
+                abandoned = self._waiters[task] == 0 and not task.done()
+                if self._waiters[task] == 0:
+                    del self._waiters[task]
+            if abandoned:
+                task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        with self._lock:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight)